@@ -0,0 +1,108 @@
+"""
+重复代码检测的基准测试
+
+在临时目录中构造一个合成语料：每个文件由随机生成的代码行组成，其中一部分文件
+插入从公共代码片段库中复制的片段（部分片段改变缩进）。分别在不检测和检测重复代码
+（--clones）的情况下统计，比较耗时和内存峰值，并计算注入的重复行被检出的比例。
+
+用法:
+    python benchmarks/bench_clones.py [--files N]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import code_counter
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def unique_lines(rng, prefix, lines):
+    return [f"{prefix}_{i} = compute({prefix}_{i - 1}, {rng.randint(0, 10 ** 9)})" for i in range(lines)]
+
+
+def build_corpus(root, files, rng):
+    """构造语料，返回出现两次及以上的片段的总行数（即应当检出的重复行数）"""
+    snippets = [unique_lines(rng, f"shared{i}", rng.randint(10, 60)) for i in range(50)]
+    uses = [0] * len(snippets)
+    for i in range(files):
+        body = unique_lines(rng, f"v{i}", rng.randint(50, 400))
+        if rng.random() < 0.3:
+            index = rng.randrange(len(snippets))
+            indent = '    ' * rng.randint(0, 2)
+            position = rng.randint(0, len(body))
+            body[position:position] = [indent + line for line in snippets[index]]
+            uses[index] += 1
+        write(os.path.join(root, f"pkg{i % 50}", f"module_{i}.py"), '\n'.join(body) + '\n')
+    return sum(len(snippet) * count for snippet, count in zip(snippets, uses) if count > 1)
+
+
+def measured(func, *args, **kwargs):
+    """先计时运行一次，再在tracemalloc下运行一次取得内存峰值（tracemalloc会明显拖慢运行）"""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    files = 2000
+    args = sys.argv[1:]
+    if len(args) == 2 and args[0] == '--files':
+        files = int(args[1])
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, 'corpus')
+        injected = build_corpus(corpus, files, rng)
+
+        # 统计函数会在当前目录下生成reports，切换到临时目录运行
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            (counts, _), plain_time, plain_peak = measured(code_counter.count_lines_by_extension, corpus)
+            _, clone_time, clone_peak = measured(code_counter.count_lines_by_extension, corpus, clones=True)
+
+            # 单独建立索引以取得报告数据
+            index = code_counter.CloneIndex()
+            for dirpath, _, names in os.walk(corpus):
+                for name in sorted(names):
+                    path = os.path.join(dirpath, name)
+                    with open(path, 'r', encoding='utf-8') as f:
+                        index.add_file(path, 'Python', code_counter.count_code_lines_hashed(f, '.py')[1])
+            report = index.report()
+        finally:
+            os.chdir(cwd)
+
+    total = sum(counts.values())
+    detected = sum(dup for _, dup in report['languages'].values())
+    print(f"语料: {files} 个文件, {total} 行代码, 注入重复 {injected} 行")
+    print(f"{'方式':<16}{'耗时':>10}{'内存峰值':>12}")
+    print(f"{'仅统计行数':<16}{plain_time:>9.2f}s{plain_peak / 1024 / 1024:>10.1f}MB")
+    print(f"{'--clones':<16}{clone_time:>9.2f}s{clone_peak / 1024 / 1024:>10.1f}MB")
+    print(f"检测重复代码的额外耗时: {clone_time / plain_time:.2f}x")
+    print(f"指纹记录数: {index.postings}, 抽样模数: {report['sampling']}")
+    print(f"检出重复行: {detected}，检出率: {detected / injected:.1%}，最大重复代码组: "
+          f"{report['groups'][0]['lines'] if report['groups'] else 0} 行 × "
+          f"{len(report['groups'][0]['instances']) if report['groups'] else 0} 处")
+
+
+if __name__ == '__main__':
+    main()
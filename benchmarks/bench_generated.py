@@ -0,0 +1,138 @@
+"""
+生成文件/压缩文件检测的基准测试
+
+在临时目录中构造一个带标注的语料：手写源码（包括 latest.py、inspect_utils.py
+这类旧规则会误删的文件名）、测试文件、带生成标记的大文件以及压缩后的单行JS。
+分别统计以下三种方式的结果与真实手写代码行数的差距，并比较耗时：
+
+- 旧规则：文件名中包含 test/spec 即排除，多段后缀（.min.js 等）无法匹配
+- 新规则，不做内容检测（--keep-generated）
+- 新规则，做内容检测（默认）
+
+用法:
+    python benchmarks/bench_generated.py [--files N]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import code_counter
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def handwritten(rng, lines):
+    body = []
+    for i in range(lines):
+        indent = '    ' * rng.randint(0, 3)
+        body.append(f"{indent}value_{i} = compute(value_{i - 1}, {rng.randint(0, 999)})")
+        if i % 7 == 0:
+            body.append('')
+    return '\n'.join(body) + '\n'
+
+
+def build_corpus(root, files, rng):
+    """构造语料，返回 (手写文件路径列表, 各类文件数量)"""
+    kinds = {'handwritten': 0, 'test': 0, 'generated': 0, 'minified': 0}
+    truth = []
+    for i in range(files):
+        package = os.path.join(root, f"pkg{i % 20}")
+        roll = rng.random()
+        if roll < 0.70:
+            # 部分手写文件使用旧规则会误删的文件名
+            name = rng.choice([f"module_{i}.py", f"latest_{i}.py", f"inspect_utils_{i}.py",
+                               f"contest_{i}.js", f"service_{i}.go"])
+            path = os.path.join(package, name)
+            write(path, handwritten(rng, rng.randint(20, 400)))
+            truth.append(path)
+            kinds['handwritten'] += 1
+        elif roll < 0.80:
+            name = rng.choice([f"test_module_{i}.py", f"widget_{i}.spec.js", f"handler_{i}_test.go"])
+            write(os.path.join(package, name), handwritten(rng, rng.randint(20, 200)))
+            kinds['test'] += 1
+        elif roll < 0.92:
+            header = rng.choice(["// Code generated by protoc-gen-go. DO NOT EDIT.\n",
+                                 "# Generated by Django 4.2 on 2024-01-01\n",
+                                 "/* This file is auto-generated, do not edit. */\n"])
+            ext = '.go' if header.startswith('//') else ('.py' if header.startswith('#') else '.js')
+            write(os.path.join(package, f"schema_{i}{ext}"), header + handwritten(rng, rng.randint(2000, 8000)))
+            kinds['generated'] += 1
+        else:
+            tokens = ''.join(f"function a{j}(b,c){{return b*c+{j}}};" for j in range(rng.randint(5000, 20000)))
+            write(os.path.join(package, f"bundle_{i}.js"), tokens + '\n')
+            kinds['minified'] += 1
+    return truth, kinds
+
+
+def legacy_lines(root):
+    """按旧的文件名规则统计行数"""
+    total = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in code_counter.EXTENSION_MAP or ext in code_counter.EXCLUDE_EXTENSIONS:
+                continue
+            if 'test' in name.lower() or 'spec' in name.lower():
+                continue
+            with open(os.path.join(dirpath, name), 'r', encoding='utf-8') as f:
+                total += code_counter.count_code_lines(f, ext)
+    return total
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    files = 2000
+    args = sys.argv[1:]
+    if len(args) == 2 and args[0] == '--files':
+        files = int(args[1])
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, 'corpus')
+        truth, kinds = build_corpus(corpus, files, rng)
+        expected = 0
+        for path in truth:
+            with open(path, 'r', encoding='utf-8') as f:
+                expected += code_counter.count_code_lines(f, os.path.splitext(path)[1])
+
+        # 统计函数会在当前目录下生成reports，切换到临时目录运行
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            legacy, legacy_time = timed(legacy_lines, corpus)
+            (keep_counts, _), keep_time = timed(code_counter.count_lines_by_extension, corpus,
+                                                 skip_generated=False)
+            (skip_counts, skip_stats), skip_time = timed(code_counter.count_lines_by_extension, corpus)
+        finally:
+            os.chdir(cwd)
+
+    print(f"语料: {files} 个文件 " + ', '.join(f"{k}={v}" for k, v in kinds.items()))
+    print(f"手写代码真实行数: {expected}")
+    print(f"{'方式':<24}{'行数':>12}{'误差':>10}{'耗时':>10}")
+    for label, lines, elapsed in [('旧规则', legacy, legacy_time),
+                                  ('新规则 --keep-generated', sum(keep_counts.values()), keep_time),
+                                  ('新规则 内容检测', sum(skip_counts.values()), skip_time)]:
+        error = (lines - expected) / expected * 100
+        print(f"{label:<24}{lines:>12}{error:>9.1f}%{elapsed:>9.2f}s")
+    print(f"内容检测跳过: {skip_stats.get('skipped', {})}")
+    print(f"内容检测相对 --keep-generated 的加速: {keep_time / skip_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+代码度量（--metrics）的基准测试
+
+在临时目录中构造一个合成语料（Python、JavaScript、Java、Go），生成时记录每个文件
+的函数数和最大嵌套深度。比较以下三种方式的耗时，并检查度量结果与生成时记录的是否一致：
+
+- 只统计行数
+- 统计行数后再单独读取每个文件计算度量（相当于原来在统计之后运行的其他工具）
+- 统计行数的同一遍读取中计算度量（--metrics）
+
+用法:
+    python benchmarks/bench_metrics.py [--files N]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import code_counter
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def python_source(rng):
+    lines, functions, deepest = [], 0, 0
+    for i in range(rng.randint(5, 40)):
+        functions += 1
+        lines.append(f"def handler_{i}(request, value):")
+        depth = rng.randint(1, 4)
+        for level in range(1, depth):
+            lines.append('    ' * level + f"if value > {level}:")
+        for j in range(rng.randint(3, 15)):
+            lines.append('    ' * depth + f"value = transform(value, {j})  # step {j}")
+        deepest = max(deepest, depth)
+        lines.append('')
+    return '\n'.join(lines) + '\n', functions, deepest
+
+
+def brace_source(rng, header, footer=''):
+    lines, functions, deepest = [], 0, 0
+    for i in range(rng.randint(5, 40)):
+        functions += 1
+        lines.append(header.format(i=i))
+        depth = rng.randint(1, 4)
+        for level in range(1, depth):
+            lines.append('    ' * level + f"if (value > {level}) {{")
+        for j in range(rng.randint(3, 15)):
+            lines.append('    ' * depth + f"value = transform(value, {j});")
+        for level in range(depth - 1, 0, -1):
+            lines.append('    ' * level + '}')
+        lines.append('}')
+        deepest = max(deepest, depth)
+    return '\n'.join(lines) + '\n' + footer, functions, deepest
+
+
+def build_corpus(root, files, rng):
+    """构造语料，返回 {相对路径: (函数数, 最大嵌套深度)}"""
+    expected = {}
+    for i in range(files):
+        kind = rng.choice(['py', 'js', 'go'])
+        if kind == 'py':
+            text, functions, deepest = python_source(rng)
+        elif kind == 'js':
+            text, functions, deepest = brace_source(rng, "function handler{i}(request, value) {{")
+        else:
+            text, functions, deepest = brace_source(rng, "func handler{i}(request *Request, value int) int {{")
+        path = f"pkg{i % 40}/module_{i}.{kind}"
+        write(os.path.join(root, path), text)
+        expected[path] = (functions, deepest)
+    return expected
+
+
+def separate_pass(root):
+    """模拟统计之后再运行的度量工具：重新遍历并读取每个文件"""
+    results = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, 'r', encoding='utf-8') as f:
+                results[path] = code_counter.count_code_metrics(f, os.path.splitext(name)[1])[1]
+    return results
+
+
+def timed(func, *args, **kwargs):
+    """运行三次取最短耗时，减少其他进程干扰"""
+    best = None
+    for _ in range(3):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    files = 3000
+    args = sys.argv[1:]
+    if len(args) == 2 and args[0] == '--files':
+        files = int(args[1])
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, 'corpus')
+        expected = build_corpus(corpus, files, rng)
+
+        # 统计函数会在当前目录下生成reports，切换到临时目录运行
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            (counts, _), base_time = timed(code_counter.count_lines_by_extension, corpus)
+            _, separate_time = timed(separate_pass, corpus)
+            _, fused_time = timed(code_counter.count_lines_by_extension, corpus, metrics=True)
+        finally:
+            os.chdir(cwd)
+        _, stats = code_counter.scan_tree(corpus, collect_files=True, metrics=True)
+
+    mismatched = [info['path'] for info in stats['files']
+                  if (info['functions'], info['max_depth']) != expected[info['path']]]
+    print(f"语料: {files} 个文件, {sum(counts.values())} 行代码")
+    print(f"{'方式':<20}{'耗时':>10}{'相对只统计行数':>16}")
+    for label, elapsed in [('只统计行数', base_time),
+                           ('统计后单独计算度量', base_time + separate_time),
+                           ('--metrics 同一遍', fused_time)]:
+        print(f"{label:<20}{elapsed:>9.2f}s{elapsed / base_time:>15.2f}x")
+    print(f"度量与生成时记录不一致的文件: {len(mismatched)} / {len(expected)}")
+    for path in mismatched[:5]:
+        print(f"    {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,514 @@
 import os
+import re
 import sys
 from collections import defaultdict
 
+# 只保留项目源代码相关的文件类型
+EXTENSION_MAP = {
+    '.c': 'C',
+    '.cpp': 'C++',
+    '.h': 'C/C++ Header',
+    '.py': 'Python',
+    '.js': 'JavaScript',
+    '.java': 'Java',
+    '.css': 'CSS',
+    # 微信小程序相关文件类型
+    '.wxml': '微信模板',
+    '.wxss': '微信样式',
+    '.wxs': '微信脚本',
+
+    # 添加更多编程语言
+    '.cs': 'C#',
+    '.go': 'Go',
+    '.rs': 'Rust',
+    '.rb': 'Ruby',
+    '.php': 'PHP',
+    '.swift': 'Swift',
+    '.kt': 'Kotlin',
+    '.ts': 'TypeScript',
+    '.jsx': 'React JSX',
+    '.tsx': 'React TSX',
+    '.vue': 'Vue',
+    '.scala': 'Scala',
+    '.dart': 'Dart',
+    '.r': 'R',
+    '.m': 'Objective-C',
+    '.mm': 'Objective-C++',
+    '.sql': 'SQL',
+    '.sh': 'Shell',
+    '.ps1': 'PowerShell',
+    '.lua': 'Lua',
+    '.pl': 'Perl',
+    '.ex': 'Elixir',
+    '.exs': 'Elixir Script',
+    '.elm': 'Elm',
+    '.fs': 'F#',
+    '.coffee': 'CoffeeScript',
+    '.sass': 'Sass',
+    '.scss': 'SCSS',
+    '.less': 'Less',
+    '.tf': 'Terraform',
+    '.yaml': 'YAML',
+    '.yml': 'YAML',
+    '.json': 'JSON',
+    '.proto': 'Protocol Buffers',
+    # 添加更多文件类型
+    '.asm': '汇编语言',
+    '.s': '汇编语言',
+    '.f90': 'Fortran',
+    '.f95': 'Fortran',
+    '.f': 'Fortran',
+    '.for': 'Fortran',
+    '.pas': 'Pascal',
+    '.pp': 'Pascal',
+    '.inc': 'Pascal',
+    '.bas': 'Basic',
+    '.vb': 'Visual Basic',
+    '.vbs': 'VBScript',
+    '.clj': 'Clojure',
+    '.cljc': 'Clojure',
+    '.cljs': 'ClojureScript',
+    '.erl': 'Erlang',
+    '.hrl': 'Erlang',
+    '.hs': 'Haskell',
+    '.lhs': 'Haskell',
+    '.ml': 'OCaml',
+    '.mli': 'OCaml',
+    '.groovy': 'Groovy',
+    '.gvy': 'Groovy',
+    '.gradle': 'Gradle',
+    '.tcl': 'Tcl',
+    '.asp': 'ASP',
+    '.aspx': 'ASP.NET',
+    '.cshtml': 'Razor',
+    '.vbhtml': 'Razor',
+    '.jsp': 'JSP',
+    '.jspx': 'JSP',
+    '.php4': 'PHP',
+    '.php5': 'PHP',
+    '.phtml': 'PHP',
+    '.nim': 'Nim',
+    '.cr': 'Crystal',
+    '.d': 'D',
+    '.v': 'Verilog',
+    '.vhd': 'VHDL',
+    '.sv': 'SystemVerilog',
+    '.pro': 'Prolog',
+    '.pl': 'Prolog',
+    '.cmake': 'CMake',
+    '.dockerfile': 'Dockerfile',
+    '.jenkins': 'Jenkins',
+    '.bat': 'Batch',
+    '.cmd': 'Batch',
+    '.ino': 'Arduino',
+    '.pde': 'Processing',
+    '.sol': 'Solidity',
+    '.nix': 'Nix',
+    '.dhall': 'Dhall',
+    '.graphql': 'GraphQL',
+    '.gql': 'GraphQL',
+    '.hcl': 'HCL',
+    '.toml': 'TOML',
+    '.ini': 'INI'
+}
+
+# 需要排除的目录
+EXCLUDE_DIRS = {
+    'node_modules',
+    'venv',
+    'env',
+    '__pycache__',
+    'dist',
+    'build',
+    'lib',
+    'libs',
+    'vendor',
+    'packages',
+    '.idea',           # IDE配置目录
+    '.vs',            # Visual Studio配置目录
+    'ipch',           # Visual Studio智能感知缓存
+    'FileContentIndex', # VS文件索引
+    'Debug',          # 调试输出目录
+    'Release',        # 发布输出目录
+    'x64',           # 64位输出目录
+    'x86',           # 32位输出目录
+    '.git',          # Git版本控制目录
+    '.svn',          # SVN版本控制目录
+    '.hg',           # Mercurial版本控制目录
+    '.tox',          # Tox测试环境目录
+    '.pytest_cache', # Pytest缓存目录
+    '.mypy_cache',   # MyPy缓存目录
+    '.coverage',     # 覆盖率报告目录
+    '.vscode',       # VSCode配置目录
+    '.DS_Store',     # macOS系统文件
+    '__MACOSX',      # macOS压缩文件目录
+    'target',         # Maven/Rust构建目录
+    'out',           # 通用输出目录
+    'bin',           # 二进制文件目录
+    'obj',           # .NET构建目录
+    'tmp',           # 临时文件目录
+    'temp',          # 临时文件目录
+    'cache',         # 缓存目录
+    'logs',          # 日志目录
+    'coverage',      # 测试覆盖率目录
+    '.next',         # Next.js构建目录
+    '.nuxt',         # Nuxt.js构建目录
+    'public/build',  # 前端构建目录
+    '.sass-cache',   # Sass缓存目录
+    '.gradle',       # Gradle构建目录
+    'gradle',        # Gradle包装器目录
+    '.cargo',        # Rust Cargo缓存
+    'migrations',    # 数据库迁移文件
+    'fixtures',      # 测试数据文件
+    'assets',        # 静态资源目录
+    'docs',          # 文档目录
+}
+
+# 需要排除的文件类型
+EXCLUDE_EXTENSIONS = {
+    '.exe', '.dll', '.so', '.dylib',  # 二进制文件
+    '.xml', '.txt', '.md', '.rst',    # 文档和配置文件
+    '.pyc', '.pyo', '.pyd',           # Python编译文件
+    '.min.js', '.min.css',            # 压缩文件
+    '.test.js', '.spec.js',           # 测试文件
+    '.log', '.lock', '.map',          # 其他工具文件
+    '.vsidx',        # VS索引文件
+    '.ipch',         # VS智能感知缓存
+    '.suo',          # VS用户选项文件
+    '.db',           # 数据库文件
+    '.cache',        # 缓存文件
+    '.gitignore',    # git配置文件
+    '.iml',          # IntelliJ IDEA模块文件
+    '.swp',          # Vim临时文件
+    '.tmp',          # 临时文件
+    '.bak',          # 备份文件
+    '.old',          # 旧文件
+    '.orig',         # 原始文件
+    '.pdf', '.doc', '.docx',  # 文档文件
+    '.xls', '.xlsx',          # Excel文件
+    '.ppt', '.pptx',          # PPT文件
+    '.zip', '.rar', '.7z',    # 压缩文件
+    '.tar', '.gz', '.bz2',    # 压缩文件
+    '.png', '.jpg', '.jpeg',  # 图片文件
+    '.gif', '.svg', '.ico',   # 图片文件
+    '.mp3', '.mp4', '.avi',   # 媒体文件
+    '.wav', '.flac', '.ogg',  # 音频文件
+    '.ttf', '.woff', '.eot',  # 字体文件
+    '.woff2', '.otf',         # 字体文件
+    '.env',                   # 环境配置文件
+    '.config',                # 配置文件
+    '.conf',                  # 配置文件
+    '.properties',            # 属性文件
+    '.d.ts',                  # TypeScript声明文件
+    '.min.map',              # Source map文件
+    '.sum',                  # Go模块校验和
+    '.mod',                  # Go模块文件
+    '.pb.go',               # Protocol Buffers生成文件
+    '.generated.*',         # 自动生成的文件
+    '.g.dart',             # Flutter生成的文件
+    '.freezed.dart',       # Freezed生成的文件
+    '.mock.ts',            # 测试模拟文件
+    '.stub.php',           # 测试桩文件
+}
+
+# 需要排除的文件名
+EXCLUDE_FILENAMES = {
+    'package-lock.json',
+    'yarn.lock',
+    'pnpm-lock.yaml',
+    'composer.lock',
+    'Gemfile.lock',
+    'poetry.lock',
+    'Cargo.lock',
+    'go.sum',
+    '.eslintrc',
+    '.prettierrc',
+    '.editorconfig',
+    '.browserslistrc',
+    'tsconfig.json',
+    'jest.config.js',
+    'babel.config.js',
+    'webpack.config.js',
+    'rollup.config.js',
+    'vite.config.js',
+    'next.config.js',
+    'nuxt.config.js',
+    'tailwind.config.js',
+    'postcss.config.js',
+    'karma.conf.js',
+    'Dockerfile',
+    'docker-compose.yml',
+    'Makefile',
+    'Rakefile',
+    'Jenkinsfile',
+}
+
+# 注释标记
+SINGLE_LINE_COMMENT_MARKERS = {
+    '.py': '#',
+    '.js': '//',
+    '.java': '//',
+    '.c': '//',
+    '.cpp': '//',
+    '.cs': '//',
+    '.go': '//',
+    '.rs': '//',
+    '.rb': '#',
+    '.php': '//',
+    '.swift': '//',
+    '.kt': '//',
+    '.ts': '//',
+    '.jsx': '//',
+    '.tsx': '//',
+    '.scala': '//',
+    '.dart': '//',
+    '.r': '#',
+    '.sh': '#',
+    '.ps1': '#',
+    '.lua': '--',
+    '.pl': '#',
+    '.ex': '#',
+    '.exs': '#',
+    '.elm': '--',
+    '.fs': '//',
+    '.coffee': '#',
+    '.sass': '//',
+    '.scss': '//',
+    '.less': '//',
+    '.tf': '#',
+    '.yaml': '#',
+    '.yml': '#',
+    '.json': '//',
+    '.proto': '//',
+    '.asm': ';',
+    '.s': ';',
+    '.f90': '!',
+    '.f95': '!',
+    '.f': '!',
+    '.for': '!',
+    '.pas': '//',
+    '.pp': '//',
+    '.inc': '//',
+    '.bas': "'",
+    '.vb': "'",
+    '.vbs': "'",
+    '.clj': ';',
+    '.cljc': ';',
+    '.cljs': ';',
+    '.erl': '%',
+    '.hrl': '%',
+    '.hs': '--',
+    '.lhs': '--',
+    '.ml': '(*',
+    '.mli': '(*',
+    '.groovy': '//',
+    '.gvy': '//',
+    '.gradle': '//',
+    '.tcl': '#',
+    '.asp': "'",
+    '.aspx': "'",
+    '.cshtml': '@*',
+    '.vbhtml': '@*',
+    '.jsp': '<%--',
+    '.jspx': '<%--',
+    '.php4': '//',
+    '.php5': '//',
+    '.phtml': '//',
+    '.nim': '#',
+    '.cr': '#',
+    '.d': '//',
+    '.v': '//',
+    '.vhd': '--',
+    '.sv': '//',
+    '.pro': '%',
+    '.pl': '%',
+    '.cmake': '#',
+    '.dockerfile': '#',
+    '.jenkins': '#',
+    '.bat': 'REM',
+    '.cmd': 'REM',
+    '.ino': '//',
+    '.pde': '//',
+    '.sol': '//',
+    '.nix': '#',
+    '.dhall': '--',
+    '.graphql': '#',
+    '.gql': '#',
+    '.hcl': '#',
+    '.toml': '#',
+    '.ini': ';'
+}
+
+# 代码度量：识别函数定义的规则，(关键字, 行首模式)，每种语言最多两个关键字。只有包含
+# 关键字的代码行才用模式匹配去掉缩进后的整行，其余代码行只做子串查找
+_JS_FUNCTION = (('function', '=>'),
+                r'((export|default|async)\s+)*function\b'
+                r'|.*(=|:)\s*(async\s+)?(function\b|(\([^)]*\)|\w+)\s*=>)')
+FUNCTION_DEFINITION_PATTERNS = {ext: (tokens, re.compile(pattern)) for ext, (tokens, pattern) in {
+    '.py': (('def',), r'(async\s+)?def\s'),
+    '.js': _JS_FUNCTION,
+    '.jsx': _JS_FUNCTION,
+    '.ts': _JS_FUNCTION,
+    '.tsx': _JS_FUNCTION,
+    '.go': (('func',), r'func\b'),
+    '.rs': (('fn',), r'(pub(\([\w:]+\))?\s+)?((async|const|unsafe|extern)\s+)*fn\s'),
+    '.rb': (('def',), r'def\s'),
+    '.php': (('function',), r'((public|private|protected|static|abstract|final)\s+)*function\b'),
+    '.swift': (('func',), r'((public|private|internal|fileprivate|open|static|class|override|mutating)\s+)*func\s'),
+    '.kt': (('fun',), r'((public|private|internal|protected|override|open|suspend|inline)\s+)*fun\s'),
+    '.scala': (('def',), r'((override|private|protected|final|implicit)\s+)*def\s'),
+    '.lua': (('function',), r'(local\s+)?function\b'),
+    '.ex': (('def',), r'defp?\s'),
+    '.exs': (('def',), r'defp?\s'),
+    '.sh': (('()',), r'(function\s+)?[\w-]+\s*\(\)'),
+    '.r': (('function',), r'[\w.]+\s*(<-|=)\s*function\b'),
+    '.groovy': (('def',), r'def\s+\w+\s*\('),
+}.items()}
+
+# 没有函数关键字的C风格方法声明：只匹配以 { 结尾、包含 ) 且不含上表关键字的代码行，单独一行的 {
+# 匹配它的上一个代码行。这些行计算嵌套深度时本来就要检查花括号，其余代码行没有额外开销。
+# JavaScript/TypeScript类和对象字面量中的简写方法不统计，否则每个 if (...) { 行都要做一次正则匹配
+_C_STYLE_FUNCTION = re.compile(
+    r'(?!(if|for|while|switch|catch|return|else|new|do|sizeof|throw|using)\b)'
+    r'([\w<>\[\],*&:~]+\s+)+[*&]*[\w:~]+\s*\([^;=]*\)\s*(const\s*)?(throws\s+[\w.,\s]+)?\{?\s*$')
+FUNCTION_BLOCK_PATTERNS = {ext: _C_STYLE_FUNCTION for ext in ('.java', '.c', '.cpp', '.cs', '.dart', '.groovy')}
+
+# 按花括号计算嵌套深度的语言
+BRACE_BLOCK_EXTENSIONS = {
+    '.js', '.jsx', '.ts', '.tsx', '.java', '.c', '.cpp', '.cs', '.go', '.rs', '.php', '.swift',
+    '.kt', '.scala', '.dart', '.groovy', '.sol', '.d', '.scss', '.less', '.ino', '.pde'
+}
+
+# 按缩进计算嵌套深度的语言：(块首行的结尾字符, 块首行的行首模式)。以这些字符结尾并且匹配
+# 行首模式的代码行开始一个缩进块（文档字符串里以冒号结尾的说明文字等不算），嵌套深度为
+# 块首行的最大缩进层数加1，缩进单位取块首行中最小的非零缩进宽度
+INDENT_BLOCK_OPENERS = {ext: (suffixes, re.compile(pattern)) for ext, (suffixes, pattern) in {
+    '.py': (':', r'(async\s+)?(if|elif|else|for|while|try|except|finally|with|def|class|match|case)\b'),
+    '.nim': (':=', r'(if|elif|else|when|case|of|for|while|try|except|finally|block|proc|func|method|'
+                   r'iterator|converter|template|macro|type|object)\b'),
+}.items()}
+
+# 超过这个长度（不含行尾空白）的代码行计为长行
+LONG_LINE_LENGTH = 120
+
+# 代码度量报告中列出的目录数量
+METRICS_REPORT_TOP = 10
+
+# 包含多个点、无法用splitext匹配的排除后缀，按文件名结尾匹配
+EXCLUDE_COMPOUND_SUFFIXES = tuple(sorted(e for e in EXCLUDE_EXTENSIONS if e.count('.') > 1 and '*' not in e))
+
+# 测试文件名规则：以 . _ - 分隔的 test/tests/spec/specs 片段，或驼峰命名的 TestXxx、XxxTest(s)、XxxSpec
+TEST_FILE_PATTERN = re.compile(r'(^|[._-])(tests?|specs?)([._-]|$)', re.IGNORECASE)
+CAMEL_TEST_FILE_PATTERN = re.compile(r'^Test[A-Z0-9_]|[a-z0-9](Tests?|Spec)$')
+
+# 生成文件检测只读取文件开头的这么多字符
+GENERATED_SNIFF_SIZE = 8192
+
+# 在文件开头多少行内查找“生成文件”标记
+GENERATED_HEADER_LINES = 10
+
+# 生成文件头部的常见标记，只在注释行中匹配
+GENERATED_HEADER_PATTERN = re.compile(
+    r'generated by|auto-?generated|code generated|do not edit|@generated', re.IGNORECASE)
+COMMENT_LINE_PREFIXES = ('#', '//', '/*', '*', '--', '<!--', ';', '%', "'", '(*')
+
+# 开头内容少于这么多字符时不做压缩文件判断
+MINIFIED_MIN_SNIFF = 1024
+
+# 平均行长超过该值或空白字符比例低于该值时视为压缩文件
+MINIFIED_AVG_LINE_LENGTH = 300
+MINIFIED_WHITESPACE_RATIO = 0.05
+
+# 归档扫描模式下可直接读取的归档类型，按后缀匹配（长后缀在前）
+ARCHIVE_SUFFIXES = (
+    ('.tar.gz', 'tar'),
+    ('.tar.bz2', 'tar'),
+    ('.tar.xz', 'tar'),
+    ('.tgz', 'tar'),
+    ('.tbz2', 'tar'),
+    ('.txz', 'tar'),
+    ('.tar', 'tar'),
+    ('.zip', 'zip'),
+    ('.gz', 'gzip'),
+)
+
+# 归档内成员路径的分隔符，例如 src.zip!/app/main.py
+ARCHIVE_SEPARATOR = '!/'
+
+# 默认最多展开的归档嵌套层数
+DEFAULT_ARCHIVE_DEPTH = 2
+
+# 嵌套的zip需要随机访问，最多在内存中缓冲这么多字节
+ARCHIVE_BUFFER_LIMIT = 64 * 1024 * 1024
+
+# 进度输出的刷新间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+# 保存上次扫描文件总数和总大小的缓存文件，用于估算剩余时间
+PROGRESS_CACHE_FILE = os.path.join('reports', 'progress_cache.json')
+
+# 按blob哈希和路径缓存的git blame结果，保存在被统计仓库的git目录中，每个仓库一份
+BLAME_CACHE_FILE = 'code_counter_blame_cache.json'
+
+# 作者到团队的映射文件，每行为 “作者名或邮箱的通配模式 = 团队名”
+TEAMS_FILE = '.codeteams'
+
+# 无法归属的代码行使用的作者名和团队名
+UNTRACKED_AUTHOR = '(未提交)'
+UNASSIGNED_TEAM = '未分配'
+
+# 重复代码检测：指纹覆盖的连续代码行数、winnowing窗口大小，
+# 任何不少于 CLONE_WINDOW_LINES + CLONE_WINNOW_WINDOW - 1 行的重复都一定能被发现
+CLONE_WINDOW_LINES = 6
+CLONE_WINNOW_WINDOW = 4
+
+# 指纹索引和行哈希数组合计的内存上限（字节），超过时按哈希值取模抽样减半。每条索引记录
+# 连同所在的列表和字典约占 CLONE_POSTING_BYTES 字节，行哈希和行号每个代码行占8字节
+CLONE_MAX_BYTES = 256 * 1024 * 1024
+CLONE_POSTING_BYTES = 250
+CLONE_LINE_BYTES = 8
+
+# 报告中列出的重复代码组和目录数量
+CLONE_REPORT_TOP = 10
+
+# 检查点日志的格式版本和fsync的最小间隔（秒）
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SYNC_INTERVAL = 2.0
+
+# 分布式模式下按哈希划分时的默认分片数
+DEFAULT_SHARD_COUNT = 16
+
+# 工作节点每条消息最多携带的逐文件记录数
+DISTRIBUTED_BATCH_SIZE = 1000
+
+# 工作节点扫描分片期间发送心跳的间隔（秒）；协调节点超过 DISTRIBUTED_IDLE_TIMEOUT 秒没有
+# 收到工作节点的任何消息时断开连接，把分片重新分配给其他工作节点
+DISTRIBUTED_HEARTBEAT_INTERVAL = 10.0
+DISTRIBUTED_IDLE_TIMEOUT = 60.0
+
+# 扫描快照文件的标识和格式版本
+SNAPSHOT_MAGIC = b'CCSNAP\x00\x00'
+SNAPSHOT_VERSION = 2
+
+# 快照文件各部分的二进制布局（小端）：
+#   头部: 标识, 版本, 文件数, 语言数, 目录数, 聚合项数, 保留字段,
+#         语言表/文件记录/字符串/目录索引/聚合项/行数排序 各部分的偏移
+#   文件记录: 路径偏移, 路径长度, 语言编号, 保留, 行数, 大小, 修改时间
+#   目录索引: 路径偏移, 路径长度, 文件记录起止下标, 聚合项起始下标和数量
+#   聚合项: 语言编号, 保留, 文件数, 行数, 大小
+#   行数排序: 全部文件按行数降序的下标，之后依次是每种语言的文件按行数降序的下标
+SNAPSHOT_HEADER = '<8sIIIIII6Q'
+SNAPSHOT_RECORD = '<QIHHQQd'
+SNAPSHOT_RECORD_KEY = '<12xH2xQ16x'  # 文件记录中只取语言编号和行数
+SNAPSHOT_DIR = '<QIIIII'
+SNAPSHOT_AGG = '<HHIQQ'
+
+# 估算模式默认的时间预算（秒）
+DEFAULT_ESTIMATE_BUDGET = 30
+
+# 估算模式置信区间使用的z值（95%置信水平）
+ESTIMATE_Z = 1.96
+
 def format_size(size):
     """将字节大小转换为人类可读格式"""
     for unit in ['B', 'KB', 'MB', 'GB']:
@@ -10,7 +517,8 @@ def format_size(size):
         size /= 1024
     return f"{size:.2f}TB"
 
-def generate_html_report(directory, language_counts, total_lines, file_stats=None, detailed=False):
+def generate_html_report(directory, language_counts, total_lines, file_stats=None, detailed=False, margins=None,
+                         attribution=None, clones=None):
     """
     生成HTML格式的统计报告
     
@@ -20,8 +528,12 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
         total_lines (int): 总行数
         file_stats (dict): 文件统计信息
         detailed (bool): 是否输出详细信息
+        margins (dict): 估算模式下各语言行数的置信区间半宽
+        attribution (dict): 作者统计结果，见 attribute_authors()
+        clones (dict): 重复代码统计结果，见 CloneIndex.report()
     """
     from datetime import datetime
+    from html import escape
     
     report_dir = 'reports'
     if not os.path.exists(report_dir):
@@ -243,7 +755,7 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
                 <h2 class="section-title">📈 总体统计</h2>
                 <div class="stats-grid">
                     <div class="stat-card">
-                        <div class="stat-value">{total_lines:,}</div>
+                        <div class="stat-value">{total_lines:,}{'' if margins is None else f' ±{margins.get(None, 0):,}'}</div>
                         <div class="stat-label">总代码行数</div>
                     </div>"""
     
@@ -269,13 +781,25 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
                     <thead>
                         <tr>
                             <th>语言</th>
-                            <th style="text-align: right;">行数</th>
+                            <th style="text-align: right;">行数</th>"""
+    
+    if margins is not None:
+        html_content += """
+                            <th style="text-align: right;">±行数</th>"""
+    
+    html_content += """
                             <th style="text-align: right;">文件数</th>
                             <th style="text-align: right;">大小</th>
                         </tr>
                     </thead>
                     <tbody>"""
     
+    def margin_cell(key):
+        if margins is None:
+            return ''
+        return f"""
+                            <td class="number">±{margins.get(key, 0):,}</td>"""
+    
     # 写入微信小程序相关统计
     wx_categories = ['微信模板', '微信样式', '微信脚本']
     for category in wx_categories:
@@ -286,7 +810,7 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
             html_content += f"""
                         <tr>
                             <td class="language-name">{category}</td>
-                            <td class="number">{language_counts[category]:,}</td>
+                            <td class="number">{language_counts[category]:,}</td>{margin_cell(category)}
                             <td class="number">{files_count:,}</td>
                             <td class="number">{size}</td>
                         </tr>"""
@@ -300,7 +824,7 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
             html_content += f"""
                         <tr>
                             <td class="language-name">{language}</td>
-                            <td class="number">{count:,}</td>
+                            <td class="number">{count:,}</td>{margin_cell(language)}
                             <td class="number">{files_count:,}</td>
                             <td class="number">{size}</td>
                         </tr>"""
@@ -310,8 +834,232 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
                 </table>
             </div>"""
     
+    # 跳过的生成/压缩文件和无法展开的嵌套归档
+    if file_stats and file_stats.get('skipped'):
+        html_content += """
+            
+            <!-- 跳过的文件 -->
+            <div class="section">
+                <h2 class="section-title">🚫 跳过的文件</h2>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>原因</th>
+                            <th style="text-align: right;">文件数</th>
+                        </tr>
+                    </thead>
+                    <tbody>"""
+        
+        for reason, count in sorted(file_stats['skipped'].items()):
+            html_content += f"""
+                        <tr>
+                            <td class="language-name">{escape(reason)}</td>
+                            <td class="number">{count:,}</td>
+                        </tr>"""
+        
+        if detailed:
+            for skipped in sorted(file_stats.get('skipped_files', []), key=lambda x: x['path']):
+                html_content += f"""
+                        <tr>
+                            <td class="file-path">{escape(skipped['path'])}</td>
+                            <td class="number">{escape(skipped['reason'])}</td>
+                        </tr>"""
+        
+        html_content += """
+                    </tbody>
+                </table>
+            </div>"""
+    
+    # 作者和团队统计
+    if attribution:
+        author_total = sum(sum(by_language.values()) for by_language in attribution['authors'].values()) or 1
+        html_content += f"""
+            
+            <!-- 作者统计 -->
+            <div class="section">
+                <h2 class="section-title">👥 作者统计</h2>
+                <p>基于提交 {attribution['commit'][:10]}</p>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>作者</th>
+                            <th style="text-align: right;">行数</th>
+                            <th style="text-align: right;">占比</th>
+                            <th style="text-align: right;">各语言行数</th>
+                        </tr>
+                    </thead>
+                    <tbody>"""
+        
+        for author, by_language in sorted(attribution['authors'].items(),
+                                          key=lambda item: (-sum(item[1].values()), item[0])):
+            lines = sum(by_language.values())
+            languages = ', '.join(f"{language} {count:,}" for language, count in
+                                  sorted(by_language.items(), key=lambda item: (-item[1], item[0])))
+            html_content += f"""
+                        <tr>
+                            <td class="language-name">{escape(author)}</td>
+                            <td class="number">{lines:,}</td>
+                            <td class="number">{lines / author_total:.1%}</td>
+                            <td class="number">{languages}</td>
+                        </tr>"""
+        
+        html_content += """
+                    </tbody>
+                </table>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>团队</th>
+                            <th style="text-align: right;">行数</th>
+                            <th style="text-align: right;">占比</th>
+                        </tr>
+                    </thead>
+                    <tbody>"""
+        
+        for team, lines in sorted(attribution['teams'].items(), key=lambda item: (-item[1], item[0])):
+            html_content += f"""
+                        <tr>
+                            <td class="language-name">{escape(team)}</td>
+                            <td class="number">{lines:,}</td>
+                            <td class="number">{lines / author_total:.1%}</td>
+                        </tr>"""
+        
+        html_content += """
+                    </tbody>
+                </table>
+            </div>"""
+    
+    # 代码度量
+    if file_stats and file_stats.get('metrics'):
+        aggregates = file_stats['metrics']
+        html_content += """
+            
+            <!-- 代码度量 -->
+            <div class="section">
+                <h2 class="section-title">📐 代码度量</h2>"""
+        
+        for heading, rows in (('语言', sorted(aggregates['languages'].items())),
+                              ('目录', sorted(aggregates['dirs'].items(),
+                                              key=lambda item: (-item[1]['functions'], item[0]))[:METRICS_REPORT_TOP])):
+            html_content += f"""
+                <table>
+                    <thead>
+                        <tr>
+                            <th>{heading}</th>
+                            <th style="text-align: right;">函数数</th>
+                            <th style="text-align: right;">最大嵌套</th>
+                            <th style="text-align: right;">长行(&gt;{LONG_LINE_LENGTH})</th>
+                            <th style="text-align: right;">最长行</th>
+                        </tr>
+                    </thead>
+                    <tbody>"""
+            
+            for name, m in rows:
+                html_content += f"""
+                        <tr>
+                            <td class="{'language-name' if heading == '语言' else 'file-path'}">{escape(name)}</td>
+                            <td class="number">{m['functions']:,}</td>
+                            <td class="number">{m['max_depth']}</td>
+                            <td class="number">{m['long_lines']:,}</td>
+                            <td class="number">{m['max_line_length']}</td>
+                        </tr>"""
+            
+            html_content += """
+                    </tbody>
+                </table>"""
+        
+        html_content += """
+            </div>"""
+    
+    # 重复代码统计
+    if clones:
+        html_content += """
+            
+            <!-- 重复代码统计 -->
+            <div class="section">
+                <h2 class="section-title">🧬 重复代码统计</h2>"""
+        if clones['sampling'] > 1:
+            html_content += f"""
+                <p>指纹索引超过内存上限，按 1/{clones['sampling']} 抽样，结果为下限估计</p>"""
+        html_content += """
+                <table>
+                    <thead>
+                        <tr>
+                            <th>语言</th>
+                            <th style="text-align: right;">代码行</th>
+                            <th style="text-align: right;">重复行</th>
+                            <th style="text-align: right;">比例</th>
+                        </tr>
+                    </thead>
+                    <tbody>"""
+        
+        for language, (code, dup) in sorted(clones['languages'].items()):
+            html_content += f"""
+                        <tr>
+                            <td class="language-name">{language}</td>
+                            <td class="number">{code:,}</td>
+                            <td class="number">{dup:,}</td>
+                            <td class="number">{dup / code if code else 0:.1%}</td>
+                        </tr>"""
+        
+        html_content += """
+                    </tbody>
+                </table>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>目录</th>
+                            <th style="text-align: right;">代码行</th>
+                            <th style="text-align: right;">重复行</th>
+                            <th style="text-align: right;">比例</th>
+                        </tr>
+                    </thead>
+                    <tbody>"""
+        
+        for clone_dir, (code, dup) in clones['dirs'].items():
+            html_content += f"""
+                        <tr>
+                            <td class="file-path">{escape(clone_dir)}</td>
+                            <td class="number">{code:,}</td>
+                            <td class="number">{dup:,}</td>
+                            <td class="number">{dup / code if code else 0:.1%}</td>
+                        </tr>"""
+        
+        html_content += """
+                    </tbody>
+                </table>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>重复代码组</th>
+                            <th style="text-align: right;">行数</th>
+                            <th style="text-align: right;">位置</th>
+                        </tr>
+                    </thead>
+                    <tbody>"""
+        
+        for i, group in enumerate(clones['groups'], 1):
+            locations = '<br>'.join(f"{escape(path)}:{start}-{end}" for path, start, end in group['instances'])
+            html_content += f"""
+                        <tr>
+                            <td class="language-name">#{i}（{len(group['instances'])} 处）</td>
+                            <td class="number">{group['lines']:,}</td>
+                            <td class="file-path">{locations}</td>
+                        </tr>"""
+        
+        html_content += """
+                    </tbody>
+                </table>
+            </div>"""
+    
     # 如果需要详细信息，添加文件列表
     if detailed and file_stats and 'files' in file_stats and file_stats['files']:
+        # 计算了代码度量时逐文件列出
+        show_metrics = bool(file_stats.get('metrics'))
+        metric_headers = """
+                                <th style="text-align: right;">函数数</th>
+                                <th style="text-align: right;">最大嵌套</th>
+                                <th style="text-align: right;">长行</th>""" if show_metrics else ''
         html_content += """
             
             <!-- 详细文件列表 -->
@@ -325,7 +1073,7 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
                                 <th style="text-align: right;">语言</th>
                                 <th style="text-align: right;">行数</th>
                                 <th style="text-align: right;">大小</th>
-                                <th style="text-align: right;">修改时间</th>
+                                <th style="text-align: right;">修改时间</th>""" + metric_headers + """
                             </tr>
                         </thead>
                         <tbody>"""
@@ -336,13 +1084,17 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
             mtime = datetime.fromtimestamp(file_info['mtime']).strftime('%Y-%m-%d %H:%M:%S')
             language = file_info.get('language', 'Unknown')
             lines = file_info.get('lines', 0)
+            metric_cells = f"""
+                                <td class="number">{file_info.get('functions', 0):,}</td>
+                                <td class="number">{file_info.get('max_depth', 0)}</td>
+                                <td class="number">{file_info.get('long_lines', 0):,}</td>""" if show_metrics else ''
             html_content += f"""
                             <tr>
-                                <td class="file-path">{path}</td>
+                                <td class="file-path">{escape(path)}</td>
                                 <td class="number">{language}</td>
                                 <td class="number">{lines:,}</td>
                                 <td class="number">{size}</td>
-                                <td class="number">{mtime}</td>
+                                <td class="number">{mtime}</td>{metric_cells}
                             </tr>"""
         
         html_content += """
@@ -366,7 +1118,8 @@ def generate_html_report(directory, language_counts, total_lines, file_stats=Non
     
     print(f"\n📊 HTML报告已保存到: {html_file}")
 
-def save_to_log(directory, language_counts, total_lines, file_stats=None, detailed=False):
+def save_to_log(directory, language_counts, total_lines, file_stats=None, detailed=False, margins=None,
+                attribution=None, clones=None):
     """
     将统计结果保存到HTML报告文件
     
@@ -376,8 +1129,11 @@ def save_to_log(directory, language_counts, total_lines, file_stats=None, detail
         total_lines (int): 总行数
         file_stats (dict): 文件统计信息
         detailed (bool): 是否输出详细信息
+        margins (dict): 估算模式下各语言行数的置信区间半宽
+        attribution (dict): 作者统计结果，见 attribute_authors()
+        clones (dict): 重复代码统计结果，见 CloneIndex.report()
     """
-    generate_html_report(directory, language_counts, total_lines, file_stats, detailed)
+    generate_html_report(directory, language_counts, total_lines, file_stats, detailed, margins, attribution, clones)
 
 def load_ignore_patterns():
     """加载忽略文件模式"""
@@ -396,453 +1152,2205 @@ def should_ignore(path, ignore_patterns):
     from fnmatch import fnmatch
     return any(fnmatch(path, pattern) for pattern in ignore_patterns)
 
-def count_lines_by_extension(directory='.', detailed=False):
-    """统计指定目录下各种编程语言的代码行数"""
-    # 只保留项目源代码相关的文件类型
-    extension_map = {
-        '.c': 'C',
-        '.cpp': 'C++',
-        '.h': 'C/C++ Header',
-        '.py': 'Python',
-        '.js': 'JavaScript',
-        '.java': 'Java',
-        '.css': 'CSS',
-        # 微信小程序相关文件类型
-        '.wxml': '微信模板',
-        '.wxss': '微信样式',
-        '.wxs': '微信脚本',
-        
-        # 添加更多编程语言
-        '.cs': 'C#',
-        '.go': 'Go',
-        '.rs': 'Rust',
-        '.rb': 'Ruby',
-        '.php': 'PHP',
-        '.swift': 'Swift',
-        '.kt': 'Kotlin',
-        '.ts': 'TypeScript',
-        '.jsx': 'React JSX',
-        '.tsx': 'React TSX',
-        '.vue': 'Vue',
-        '.scala': 'Scala',
-        '.dart': 'Dart',
-        '.r': 'R',
-        '.m': 'Objective-C',
-        '.mm': 'Objective-C++',
-        '.sql': 'SQL',
-        '.sh': 'Shell',
-        '.ps1': 'PowerShell',
-        '.lua': 'Lua',
-        '.pl': 'Perl',
-        '.ex': 'Elixir',
-        '.exs': 'Elixir Script',
-        '.elm': 'Elm',
-        '.fs': 'F#',
-        '.coffee': 'CoffeeScript',
-        '.sass': 'Sass',
-        '.scss': 'SCSS',
-        '.less': 'Less',
-        '.tf': 'Terraform',
-        '.yaml': 'YAML',
-        '.yml': 'YAML',
-        '.json': 'JSON',
-        '.proto': 'Protocol Buffers',
-        # 添加更多文件类型
-        '.asm': '汇编语言',
-        '.s': '汇编语言',
-        '.f90': 'Fortran',
-        '.f95': 'Fortran',
-        '.f': 'Fortran',
-        '.for': 'Fortran',
-        '.pas': 'Pascal',
-        '.pp': 'Pascal',
-        '.inc': 'Pascal',
-        '.bas': 'Basic',
-        '.vb': 'Visual Basic',
-        '.vbs': 'VBScript',
-        '.clj': 'Clojure',
-        '.cljc': 'Clojure',
-        '.cljs': 'ClojureScript',
-        '.erl': 'Erlang',
-        '.hrl': 'Erlang',
-        '.hs': 'Haskell',
-        '.lhs': 'Haskell',
-        '.ml': 'OCaml',
-        '.mli': 'OCaml',
-        '.groovy': 'Groovy',
-        '.gvy': 'Groovy',
-        '.gradle': 'Gradle',
-        '.tcl': 'Tcl',
-        '.asp': 'ASP',
-        '.aspx': 'ASP.NET',
-        '.cshtml': 'Razor',
-        '.vbhtml': 'Razor',
-        '.jsp': 'JSP',
-        '.jspx': 'JSP',
-        '.php4': 'PHP',
-        '.php5': 'PHP',
-        '.phtml': 'PHP',
-        '.nim': 'Nim',
-        '.cr': 'Crystal',
-        '.d': 'D',
-        '.v': 'Verilog',
-        '.vhd': 'VHDL',
-        '.sv': 'SystemVerilog',
-        '.pro': 'Prolog',
-        '.pl': 'Prolog',
-        '.cmake': 'CMake',
-        '.dockerfile': 'Dockerfile',
-        '.jenkins': 'Jenkins',
-        '.bat': 'Batch',
-        '.cmd': 'Batch',
-        '.ino': 'Arduino',
-        '.pde': 'Processing',
-        '.sol': 'Solidity',
-        '.nix': 'Nix',
-        '.dhall': 'Dhall',
-        '.graphql': 'GraphQL',
-        '.gql': 'GraphQL',
-        '.hcl': 'HCL',
-        '.toml': 'TOML',
-        '.ini': 'INI'
-    }
-    
-    # 需要排除的目录
-    exclude_dirs = {
-        'node_modules',
-        'venv',
-        'env',
-        '__pycache__',
-        'dist',
-        'build',
-        'lib',
-        'libs',
-        'vendor',
-        'packages',
-        '.idea',           # IDE配置目录
-        '.vs',            # Visual Studio配置目录
-        'ipch',           # Visual Studio智能感知缓存
-        'FileContentIndex', # VS文件索引
-        'Debug',          # 调试输出目录
-        'Release',        # 发布输出目录
-        'x64',           # 64位输出目录
-        'x86',           # 32位输出目录
-        '.git',          # Git版本控制目录
-        '.svn',          # SVN版本控制目录
-        '.hg',           # Mercurial版本控制目录
-        '.tox',          # Tox测试环境目录
-        '.pytest_cache', # Pytest缓存目录
-        '.mypy_cache',   # MyPy缓存目录
-        '.coverage',     # 覆盖率报告目录
-        '.vscode',       # VSCode配置目录
-        '.DS_Store',     # macOS系统文件
-        '__MACOSX',      # macOS压缩文件目录
-        'target',         # Maven/Rust构建目录
-        'out',           # 通用输出目录
-        'bin',           # 二进制文件目录
-        'obj',           # .NET构建目录
-        'tmp',           # 临时文件目录
-        'temp',          # 临时文件目录
-        'cache',         # 缓存目录
-        'logs',          # 日志目录
-        'coverage',      # 测试覆盖率目录
-        '.next',         # Next.js构建目录
-        '.nuxt',         # Nuxt.js构建目录
-        'public/build',  # 前端构建目录
-        '.sass-cache',   # Sass缓存目录
-        '.gradle',       # Gradle构建目录
-        'gradle',        # Gradle包装器目录
-        '.cargo',        # Rust Cargo缓存
-        'migrations',    # 数据库迁移文件
-        'fixtures',      # 测试数据文件
-        'assets',        # 静态资源目录
-        'docs',          # 文档目录
-    }
-    
-    # 需要排除的文件类型
-    exclude_extensions = {
-        '.exe', '.dll', '.so', '.dylib',  # 二进制文件
-        '.xml', '.txt', '.md', '.rst',    # 文档和配置文件
-        '.pyc', '.pyo', '.pyd',           # Python编译文件
-        '.min.js', '.min.css',            # 压缩文件
-        '.test.js', '.spec.js',           # 测试文件
-        '.log', '.lock', '.map',          # 其他工具文件
-        '.vsidx',        # VS索引文件
-        '.ipch',         # VS智能感知缓存
-        '.suo',          # VS用户选项文件
-        '.db',           # 数据库文件
-        '.cache',        # 缓存文件
-        '.gitignore',    # git配置文件
-        '.iml',          # IntelliJ IDEA模块文件
-        '.swp',          # Vim临时文件
-        '.tmp',          # 临时文件
-        '.bak',          # 备份文件
-        '.old',          # 旧文件
-        '.orig',         # 原始文件
-        '.pdf', '.doc', '.docx',  # 文档文件
-        '.xls', '.xlsx',          # Excel文件
-        '.ppt', '.pptx',          # PPT文件
-        '.zip', '.rar', '.7z',    # 压缩文件
-        '.tar', '.gz', '.bz2',    # 压缩文件
-        '.png', '.jpg', '.jpeg',  # 图片文件
-        '.gif', '.svg', '.ico',   # 图片文件
-        '.mp3', '.mp4', '.avi',   # 媒体文件
-        '.wav', '.flac', '.ogg',  # 音频文件
-        '.ttf', '.woff', '.eot',  # 字体文件
-        '.woff2', '.otf',         # 字体文件
-        '.env',                   # 环境配置文件
-        '.config',                # 配置文件
-        '.conf',                  # 配置文件
-        '.properties',            # 属性文件
-        '.d.ts',                  # TypeScript声明文件
-        '.min.map',              # Source map文件
-        '.sum',                  # Go模块校验和
-        '.mod',                  # Go模块文件
-        '.pb.go',               # Protocol Buffers生成文件
-        '.generated.*',         # 自动生成的文件
-        '.g.dart',             # Flutter生成的文件
-        '.freezed.dart',       # Freezed生成的文件
-        '.mock.ts',            # 测试模拟文件
-        '.stub.php',           # 测试桩文件
-    }
-    
-    # 需要排除的文件名
-    exclude_filenames = {
-        'package-lock.json',
-        'yarn.lock',
-        'pnpm-lock.yaml',
-        'composer.lock',
-        'Gemfile.lock',
-        'poetry.lock',
-        'Cargo.lock',
-        'go.sum',
-        '.eslintrc',
-        '.prettierrc',
-        '.editorconfig',
-        '.browserslistrc',
-        'tsconfig.json',
-        'jest.config.js',
-        'babel.config.js',
-        'webpack.config.js',
-        'rollup.config.js',
-        'vite.config.js',
-        'next.config.js',
-        'nuxt.config.js',
-        'tailwind.config.js',
-        'postcss.config.js',
-        'karma.conf.js',
-        'Dockerfile',
-        'docker-compose.yml',
-        'Makefile',
-        'Rakefile',
-        'Jenkinsfile',
-    }
-    
-    # 用于存储每种语言的行数
-    language_counts = defaultdict(int)
-    file_stats = {
-        'total_files': 0,
-        'total_size': 0,
-        'files': [],
-    }
-    
-    # 加载忽略模式
-    ignore_patterns = load_ignore_patterns()
+def prune_dirs(root, dirs, ignore_patterns):
+    """在os.walk过程中原地移除需要排除的子目录"""
+    dirs[:] = [d for d in dirs if not d.startswith('.') 
+              and d not in EXCLUDE_DIRS
+              and not should_ignore(os.path.join(root, d), ignore_patterns)]
+
+def parse_duration(text):
+    """将 30s、2m、1h 或纯数字（秒）形式的时长转换为秒数"""
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    text = text.strip().lower()
+    scale = 1
+    if text and text[-1] in units:
+        scale = units[text[-1]]
+        text = text[:-1]
+    seconds = float(text) * scale
+    if seconds <= 0:
+        raise ValueError(f"无效的时长: {text}")
+    return seconds
+
+def print_results(language_counts, file_stats, margins=None, title="代码统计结果"):
+    """
+    在控制台打印统计结果表格
     
-    # 注释标记
-    single_line_comment_markers = {
-        '.py': '#',
-        '.js': '//',
-        '.java': '//',
-        '.c': '//',
-        '.cpp': '//',
-        '.cs': '//',
-        '.go': '//',
-        '.rs': '//',
-        '.rb': '#',
-        '.php': '//',
-        '.swift': '//',
-        '.kt': '//',
-        '.ts': '//',
-        '.jsx': '//',
-        '.tsx': '//',
-        '.scala': '//',
-        '.dart': '//',
-        '.r': '#',
-        '.sh': '#',
-        '.ps1': '#',
-        '.lua': '--',
-        '.pl': '#',
-        '.ex': '#',
-        '.exs': '#',
-        '.elm': '--',
-        '.fs': '//',
-        '.coffee': '#',
-        '.sass': '//',
-        '.scss': '//',
-        '.less': '//',
-        '.tf': '#',
-        '.yaml': '#',
-        '.yml': '#',
-        '.json': '//',
-        '.proto': '//',
-        '.asm': ';',
-        '.s': ';',
-        '.f90': '!',
-        '.f95': '!',
-        '.f': '!',
-        '.for': '!',
-        '.pas': '//',
-        '.pp': '//',
-        '.inc': '//',
-        '.bas': "'",
-        '.vb': "'",
-        '.vbs': "'",
-        '.clj': ';',
-        '.cljc': ';',
-        '.cljs': ';',
-        '.erl': '%',
-        '.hrl': '%',
-        '.hs': '--',
-        '.lhs': '--',
-        '.ml': '(*',
-        '.mli': '(*',
-        '.groovy': '//',
-        '.gvy': '//',
-        '.gradle': '//',
-        '.tcl': '#',
-        '.asp': "'",
-        '.aspx': "'",
-        '.cshtml': '@*',
-        '.vbhtml': '@*',
-        '.jsp': '<%--',
-        '.jspx': '<%--',
-        '.php4': '//',
-        '.php5': '//',
-        '.phtml': '//',
-        '.nim': '#',
-        '.cr': '#',
-        '.d': '//',
-        '.v': '//',
-        '.vhd': '--',
-        '.sv': '//',
-        '.pro': '%',
-        '.pl': '%',
-        '.cmake': '#',
-        '.dockerfile': '#',
-        '.jenkins': '#',
-        '.bat': 'REM',
-        '.cmd': 'REM',
-        '.ino': '//',
-        '.pde': '//',
-        '.sol': '//',
-        '.nix': '#',
-        '.dhall': '--',
-        '.graphql': '#',
-        '.gql': '#',
-        '.hcl': '#',
-        '.toml': '#',
-        '.ini': ';'
-    }
+    Args:
+        language_counts (dict): 各语言的行数统计
+        file_stats (dict): 文件统计信息
+        margins (dict): 估算模式下各语言行数的置信区间半宽，键 None 对应总计
+        title (str): 表格标题
+    """
+    width = 50 if margins is not None else 40
+    margin_header = f"{'±':>10}" if margins is not None else ''
     
-    # 遍历指定目录及其子目录
-    for root, dirs, files in os.walk(directory):
-        # 移除需要排除的目录
-        dirs[:] = [d for d in dirs if not d.startswith('.') 
-                  and d not in exclude_dirs
-                  and not should_ignore(os.path.join(root, d), ignore_patterns)]
-        
-        for file in files:
-            if file.startswith('.') or file in exclude_filenames:
-                continue
-                
-            file_path = os.path.join(root, file)
-            if should_ignore(file_path, ignore_patterns):
-                continue
-                
-            ext = os.path.splitext(file)[1].lower()
-            if ext in exclude_extensions:
-                continue
-            
-            if 'test' in file.lower() or 'spec' in file.lower():
-                continue
-                
-            try:
-                file_size = os.path.getsize(file_path)
-                file_mtime = os.path.getmtime(file_path)
-                
-                if ext in extension_map:
-                    language = extension_map[ext]
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        lines = sum(1 for line in f if line.strip() 
-                                  and not (ext in single_line_comment_markers 
-                                         and line.strip().startswith(single_line_comment_markers[ext])))
-                        
-                        language_counts[language] += lines
-                        
-                        # 更新文件统计信息
-                        if language not in file_stats:
-                            file_stats[language] = {'files': 0, 'size': 0}
-                        file_stats[language]['files'] += 1
-                        file_stats[language]['size'] += file_size
-                        
-                        if detailed:
-                            file_stats['files'].append({
-                                'path': os.path.relpath(file_path, directory),
-                                'size': file_size,
-                                'mtime': file_mtime,
-                                'language': language,
-                                'lines': lines
-                            })
-                
-                file_stats['total_files'] += 1
-                file_stats['total_size'] += file_size
-                
-            except:
-                continue
+    def margin_column(key):
+        return f"{margins.get(key, 0):>10}" if margins is not None else ''
     
-    # 打印结果
-    print("\n代码统计结果:")
-    print("-" * 40)
+    print(f"\n{title}:")
+    print("-" * width)
     print(f"总文件数: {file_stats['total_files']}")
     print(f"总大小: {format_size(file_stats['total_size'])}")
-    print("-" * 40)
-    print(f"{'语言':<15}{'行数':>10}{'文件数':>10}{'大小':>12}")
-    print("-" * 40)
+    print("-" * width)
+    print(f"{'语言':<15}{'行数':>10}{margin_header}{'文件数':>10}{'大小':>12}")
+    print("-" * width)
     
     # 首先打印微信小程序相关的统计
     wx_categories = ['微信模板', '微信样式', '微信脚本']
     for category in wx_categories:
         if language_counts[category] > 0:
             stats = file_stats.get(category, {})
-            print(f"{category:<15}{language_counts[category]:>10}"
+            print(f"{category:<15}{language_counts[category]:>10}{margin_column(category)}"
                    f"{stats.get('files', 0):>10}{format_size(stats.get('size', 0)):>12}")
             
     # 然后打印其他语言的统计
     for language, count in sorted(language_counts.items()):
         if language not in wx_categories:  # 跳过已经打印的微信相关类别
             stats = file_stats.get(language, {})
-            print(f"{language:<15}{count:>10}"
+            print(f"{language:<15}{count:>10}{margin_column(language)}"
                    f"{stats.get('files', 0):>10}{format_size(stats.get('size', 0)):>12}")
     
     total_lines = sum(language_counts.values())
-    print("-" * 40)
-    print(f"{'总计':<15}{total_lines:>10}")
+    print("-" * width)
+    print(f"{'总计':<15}{total_lines:>10}{margin_column(None)}")
+
+class ProgressReporter:
+    """
+    在后台线程中定时输出扫描进度
     
-    # 保存结果到日志文件
-    save_to_log(directory, language_counts, total_lines, file_stats, detailed)
+    统计循环只调用 advance() 累加计数并更新 current_dir，速率和剩余时间的计算、
+    控制台刷新以及JSON进度流的写入都在后台线程中按固定间隔完成。总量未知时可以用
+    count_totals() 在另一个后台线程中预扫描，得到总量之前剩余时间显示为未知。
+    """
+    
+    def __init__(self, total_files=0, total_bytes=0, console=True, stream=None,
+                 interval=PROGRESS_INTERVAL):
+        """
+        Args:
+            total_files (int): 预计的文件总数，未知时为0
+            total_bytes (int): 预计的总字节数，未知时为0
+            console (bool): 是否在标准错误输出上显示进度行
+            stream: 写入JSON Lines格式进度记录的文本流，为None时不写入
+            interval (float): 刷新间隔（秒）
+        """
+        import threading
+        
+        self.files = 0
+        self.bytes = 0
+        self.resumed_files = 0
+        self.resumed_bytes = 0
+        self.current_dir = ''
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.console = console
+        self.stream = stream
+        self.interval = interval
+        self.started = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+    
+    def advance(self, size):
+        """记录一个已处理的文件"""
+        self.files += 1
+        self.bytes += size
+    
+    def add_resumed(self, files, size):
+        """计入从检查点恢复的已完成文件，速率只按本次运行处理的文件计算"""
+        self.files += files
+        self.bytes += size
+        self.resumed_files += files
+        self.resumed_bytes += size
+    
+    def start(self):
+        import time
+        self.started = time.monotonic()
+        self.thread.start()
+    
+    def count_totals(self, directory, scan_archives=False):
+        """在后台线程中预扫描目录的文件总数和总字节数，完成后用于估算剩余时间"""
+        import threading
+        
+        def scan():
+            self.total_files, self.total_bytes = count_scan_totals(directory, scan_archives)
+        
+        threading.Thread(target=scan, daemon=True).start()
+    
+    def stop(self):
+        """停止后台刷新并输出最终进度"""
+        self.stopped.set()
+        self.thread.join()
+        self.report(done=True)
+        if self.console:
+            sys.stderr.write('\n')
+            sys.stderr.flush()
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+    
+    def snapshot(self):
+        """计算当前的进度、速率和预计剩余时间"""
+        import time
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        files, size = self.files, self.bytes
+        bytes_per_sec = (size - self.resumed_bytes) / elapsed
+        files_per_sec = (files - self.resumed_files) / elapsed
+        eta = None
+        if self.total_bytes and bytes_per_sec > 0:
+            eta = max(self.total_bytes - size, 0) / bytes_per_sec
+        elif self.total_files and files_per_sec > 0:
+            eta = max(self.total_files - files, 0) / files_per_sec
+        return {
+            'elapsed': round(elapsed, 3),
+            'files': files,
+            'bytes': size,
+            'total_files': self.total_files,
+            'total_bytes': self.total_bytes,
+            'files_per_sec': round(files_per_sec, 1),
+            'bytes_per_sec': round(bytes_per_sec, 1),
+            'eta_seconds': None if eta is None else round(eta, 1),
+            'current_dir': self.current_dir,
+        }
+    
+    def report(self, done=False):
+        """输出一次进度"""
+        import json
+        import shutil
+        
+        info = self.snapshot()
+        info['done'] = done
+        if self.stream is not None:
+            self.stream.write(json.dumps(info, ensure_ascii=False) + '\n')
+            self.stream.flush()
+        if self.console:
+            eta = info['eta_seconds']
+            eta_text = '--:--:--' if eta is None else '%02d:%02d:%02d' % (eta // 3600, eta % 3600 // 60, eta % 60)
+            total = f"/{self.total_files}" if self.total_files else ''
+            line = (f"已处理 {info['files']}{total} 个文件  {info['files_per_sec']:.1f} 文件/秒  "
+                    f"{format_size(info['bytes_per_sec'])}/秒  剩余 {eta_text}  {info['current_dir']}")
+            width = shutil.get_terminal_size().columns - 1
+            sys.stderr.write('\r' + line[:width].ljust(width))
+            sys.stderr.flush()
 
-def print_usage():
-    """打印使用说明"""
-    print("""
-代码行数统计工具
+def progress_cache_key(directory, scan_archives):
+    """进度总量缓存的键：目录的绝对路径，扫描归档时总量按成员计算，另加后缀区分"""
+    key = os.path.abspath(directory)
+    return key + '#archives' if scan_archives else key
 
-用法:
-    python code_counter.py [选项] [目录路径]
+def load_progress_totals(directory, scan_archives=False):
+    """读取上次以相同方式扫描该目录时的文件总数和总字节数，没有记录时返回None"""
+    import json
+    try:
+        with open(PROGRESS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            totals = json.load(f).get(progress_cache_key(directory, scan_archives))
+    except (OSError, ValueError):
+        return None
+    return (totals['files'], totals['bytes']) if totals else None
 
-选项:
-    -h, --help      显示帮助信息
+def save_progress_totals(directory, files, size, scan_archives=False):
+    """记录本次扫描的文件总数和总字节数，供下次估算剩余时间"""
+    import json
+    try:
+        with open(PROGRESS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[progress_cache_key(directory, scan_archives)] = {'files': files, 'bytes': size}
+    os.makedirs(os.path.dirname(PROGRESS_CACHE_FILE), exist_ok=True)
+    with open(PROGRESS_CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def count_scan_totals(directory, scan_archives=False):
+    """只读取元数据预先统计将要处理的文件数和总字节数，用于估算剩余时间"""
+    ignore_patterns = load_ignore_patterns()
+    files_total = bytes_total = 0
+    for root, dirs, files in os.walk(directory):
+        prune_dirs(root, dirs, ignore_patterns)
+        for file in files:
+            file_path = os.path.join(root, file)
+            is_archive = scan_archives and archive_kind(file)
+            if is_excluded_file(file, file_path, ignore_patterns, check_extension=not is_archive):
+                continue
+            try:
+                bytes_total += os.path.getsize(file_path)
+            except OSError:
+                continue
+            files_total += 1
+    return files_total, bytes_total
+
+def count_code_lines(lines, ext):
+    """统计非空且不是单行注释的代码行数"""
+    marker = SINGLE_LINE_COMMENT_MARKERS.get(ext)
+    count = 0
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not (marker and stripped.startswith(marker)):
+            count += 1
+    return count
+
+def count_code_lines_hashed(lines, ext):
+    """
+    与 count_code_lines() 相同地统计代码行，同时返回每个代码行的哈希
+    
+    代码行去掉所有空白字符后再计算哈希，缩进或空格不同的重复代码也能匹配。
+    
+    Returns:
+        tuple: (代码行数, [(行哈希, 行号), ...])
+    """
+    import zlib
+    marker = SINGLE_LINE_COMMENT_MARKERS.get(ext)
+    hashes = []
+    for line_no, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if stripped and not (marker and stripped.startswith(marker)):
+            # 内置的字符串哈希每个进程随机，用crc32保证每次统计选出相同的指纹
+            hashes.append((zlib.crc32(''.join(stripped.split()).encode('utf-8')), line_no))
+    return len(hashes), hashes
+
+def count_code_metrics(lines, ext, hashes=None):
+    """
+    与 count_code_lines() 相同地统计代码行，同时计算函数数、最大嵌套深度和长行数
+    
+    度量都是按行的轻量估计，不解析字符串和多行注释。每个代码行只做几次子串查找和长度
+    比较，正则匹配和精确计算只在少数可能改变结果的行上进行：
+    
+    - 函数：包含 FUNCTION_DEFINITION_PATTERNS 关键字的行按模式匹配；FUNCTION_BLOCK_PATTERNS
+      中的语言再匹配以 { 结尾且包含 ) 的行
+    - 嵌套深度：花括号语言按每行 { 和 } 的个数计算（行首的 } 先计入）；INDENT_BLOCK_OPENERS
+      中的语言按块首行的缩进计算，缩进不超过已知范围的行不用确认是否为块首行
+    - 长行：行的原始长度超过当前最长行或长行阈值时，才去掉行尾空白计算实际长度
+    
+    Args:
+        lines: 逐行迭代的文件内容
+        ext (str): 文件扩展名
+        hashes (list): 指定时同时追加每个代码行的 (行哈希, 行号)，见 count_code_lines_hashed()
+    
+    Returns:
+        tuple: (代码行数, {'functions', 'max_depth', 'long_lines', 'max_line_length'})
+    """
+    import zlib
+    
+    marker = SINGLE_LINE_COMMENT_MARKERS.get(ext)
+    tokens, pattern = FUNCTION_DEFINITION_PATTERNS.get(ext, ((), None))
+    # 去掉首尾空白的代码行中不会有换行符，没有规则的语言用它作关键字，不会匹配
+    token = tokens[0] if tokens else '\n'
+    token2 = tokens[1] if len(tokens) > 1 else None
+    block_pattern = FUNCTION_BLOCK_PATTERNS.get(ext)
+    brace_block = ext in BRACE_BLOCK_EXTENSIONS
+    openers, opener_pattern = INDENT_BLOCK_OPENERS.get(ext, ('', None))
+    
+    count = functions = long_lines = longest = 0
+    depth = max_depth = 0
+    # 块首行的最大缩进、最小的非零缩进，以及是否有块首行
+    widest = unit = 0
+    opened = False
+    # 原始长度不超过 bound 的行不可能成为最长行或长行
+    bound = 0
+    previous = ''
+    for line_no, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if not stripped or (marker and stripped.startswith(marker)):
+            continue
+        count += 1
+        if hashes is not None:
+            hashes.append((zlib.crc32(''.join(stripped.split()).encode('utf-8')), line_no))
+        
+        if len(line) > bound:
+            length = len(line.rstrip())
+            if length > LONG_LINE_LENGTH:
+                long_lines += 1
+            if length > longest:
+                longest = length
+            bound = min(longest, LONG_LINE_LENGTH)
+        
+        if (token in stripped or token2 and token2 in stripped) and pattern.match(stripped):
+            functions += 1
+        
+        if brace_block:
+            if '{' in stripped:
+                if '}' in stripped:
+                    # 同一行中既有 { 又有 }：先计入行首的 }（如 } else {），再计入 {，最后计入其余的 }
+                    leading = len(stripped) - len(stripped.lstrip('}'))
+                    depth -= leading
+                    closing = stripped.count('}') - leading
+                else:
+                    closing = 0
+                depth += stripped.count('{')
+                if depth > max_depth:
+                    max_depth = depth
+                depth -= closing
+                if block_pattern is not None and stripped[-1] == '{':
+                    header = previous if stripped == '{' else stripped
+                    # 方法声明都有参数列表，没有 ) 的行不用匹配
+                    if (')' in header and token not in header and not (token2 and token2 in header)
+                            and block_pattern.match(header)):
+                        functions += 1
+            elif '}' in stripped:
+                depth -= stripped.count('}')
+            previous = stripped
+        elif openers and stripped[-1] in openers:
+            # 只有可能改变最大缩进或缩进单位的行才需要确认是否为块首行
+            indent = len(line) - len(line.lstrip())
+            if ((indent > widest or not opened or (indent and (not unit or indent < unit)))
+                    and opener_pattern.match(stripped)):
+                opened = True
+                if indent > widest:
+                    widest = indent
+                if indent and (not unit or indent < unit):
+                    unit = indent
+    
+    if opened:
+        max_depth = widest // unit + 1 if unit else 1
+    return count, {'functions': functions, 'max_depth': max_depth,
+                   'long_lines': long_lines, 'max_line_length': longest}
+
+def is_test_file(file):
+    """根据文件名判断是否为测试文件，只匹配完整的 test/spec 片段（latest.py 不算）"""
+    stem = os.path.splitext(file)[0]
+    return bool(TEST_FILE_PATTERN.search(stem) or CAMEL_TEST_FILE_PATTERN.search(stem))
+
+def is_excluded_file(file, file_path, ignore_patterns, check_extension=True):
+    """按文件名、忽略规则、扩展名和测试文件规则判断是否排除该文件"""
+    if file.startswith('.') or file in EXCLUDE_FILENAMES:
+        return True
+    if should_ignore(file_path, ignore_patterns):
+        return True
+    if check_extension:
+        name = file.lower()
+        if os.path.splitext(name)[1] in EXCLUDE_EXTENSIONS:
+            return True
+        if name.endswith(EXCLUDE_COMPOUND_SUFFIXES) or '.generated.' in name:
+            return True
+    return is_test_file(file)
+
+def detect_generated(head):
+    """
+    根据文件开头的内容判断是否为生成文件或压缩文件
+    
+    Args:
+        head (str): 文件开头最多 GENERATED_SNIFF_SIZE 个字符
+    
+    Returns:
+        str: 跳过的原因，不是生成文件时返回None
+    """
+    for line in head.split('\n', GENERATED_HEADER_LINES)[:GENERATED_HEADER_LINES]:
+        stripped = line.strip()
+        if stripped.startswith(COMMENT_LINE_PREFIXES) and GENERATED_HEADER_PATTERN.search(stripped):
+            return '生成文件标记'
+    
+    if len(head) < MINIFIED_MIN_SNIFF:
+        return None
+    newlines = head.count('\n')
+    if len(head) / (newlines + 1) > MINIFIED_AVG_LINE_LENGTH:
+        return '平均行长过长'
+    whitespace = sum(head.count(c) for c in ' \t') + newlines
+    if whitespace / len(head) < MINIFIED_WHITESPACE_RATIO:
+        return '空白字符过少'
+    return None
+
+def record_skipped(file_stats, path, reason, detailed=False):
+    """记录一个跳过的文件（生成/压缩文件、无法展开的嵌套归档）"""
+    skipped = file_stats.setdefault('skipped', {})
+    skipped[reason] = skipped.get(reason, 0) + 1
+    if detailed:
+        file_stats.setdefault('skipped_files', []).append({'path': path, 'reason': reason})
+
+def print_skipped(file_stats):
+    """按原因打印跳过的文件数量"""
+    skipped = file_stats.get('skipped')
+    if not skipped:
+        return
+    details = '，'.join(f"{reason} {count}" for reason, count in sorted(skipped.items()))
+    print(f"已跳过文件 {sum(skipped.values())} 个（{details}）")
+
+def merge_metrics(target, metrics):
+    """将一个文件（或一组文件）的代码度量累加到汇总中，计数相加，最大值取最大"""
+    target['files'] = target.get('files', 0) + metrics.get('files', 1)
+    for key in ('functions', 'long_lines'):
+        target[key] = target.get(key, 0) + metrics[key]
+    for key in ('max_depth', 'max_line_length'):
+        target[key] = max(target.get(key, 0), metrics[key])
+
+def record_metrics(file_stats, path, language, metrics):
+    """将单个文件的代码度量累加到按语言和按目录的汇总中"""
+    aggregates = file_stats.setdefault('metrics', {'languages': {}, 'dirs': {}})
+    merge_metrics(aggregates['languages'].setdefault(language, {}), metrics)
+    merge_metrics(aggregates['dirs'].setdefault(path.rpartition('/')[0] or '.', {}), metrics)
+
+def print_metrics(file_stats):
+    """打印按语言和按目录汇总的代码度量"""
+    aggregates = file_stats.get('metrics')
+    if not aggregates:
+        return
+    
+    def row(name, m):
+        return (f"{name:<15}{m['functions']:>10}{m['max_depth']:>10}{m['long_lines']:>10}"
+                f"{m['max_line_length']:>10}")
+    
+    print("\n代码度量:")
+    print("-" * 55)
+    print(f"{'语言':<15}{'函数数':>10}{'最大嵌套':>10}{f'长行(>{LONG_LINE_LENGTH})':>10}{'最长行':>10}")
+    print("-" * 55)
+    for language, m in sorted(aggregates['languages'].items()):
+        print(row(language, m))
+    
+    dirs = sorted(aggregates['dirs'].items(), key=lambda item: (-item[1]['functions'], item[0]))
+    print("\n函数最多的目录:")
+    for directory, m in dirs[:METRICS_REPORT_TOP]:
+        print(f"{m['functions']:>10}  嵌套 {m['max_depth']:>3}  长行 {m['long_lines']:>6}  {directory}")
+
+def record_file(language_counts, file_stats, path, size, mtime, language=None, lines=0, detailed=False,
+                metrics=None):
+    """将单个文件的统计结果累加到汇总数据中，metrics 为 count_code_metrics() 计算的代码度量"""
+    if language:
+        language_counts[language] += lines
+        
+        # 更新文件统计信息
+        if language not in file_stats:
+            file_stats[language] = {'files': 0, 'size': 0}
+        file_stats[language]['files'] += 1
+        file_stats[language]['size'] += size
+        
+        if detailed:
+            file_stats['files'].append({
+                'path': path,
+                'size': size,
+                'mtime': mtime,
+                'language': language,
+                'lines': lines,
+                **(metrics or {})
+            })
+        if metrics:
+            record_metrics(file_stats, path, language, metrics)
+    
+    file_stats['total_files'] += 1
+    file_stats['total_size'] += size
+
+def archive_kind(filename):
+    """根据文件名判断归档类型，不是归档文件时返回None"""
+    name = filename.lower()
+    for suffix, kind in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return kind
+    return None
+
+def read_into_memory(stream, limit):
+    """将流读入内存，超过限制时返回None"""
+    import io
+    data = stream.read(limit + 1)
+    if len(data) > limit:
+        return None
+    return io.BytesIO(data)
+
+def scan_archive(fileobj, kind, archive_path, rel_path, depth, ignore_patterns, on_member, archive_size=0,
+                 on_skipped=None):
+    """
+    流式遍历归档文件中的成员，不解压到磁盘
+    
+    成员路径以 "归档路径!/成员名" 的形式参与忽略规则匹配，目录和文件的排除规则
+    与普通目录遍历一致。嵌套的归档文件在 depth 大于1时递归展开。
+    
+    Args:
+        fileobj: 归档文件的二进制文件对象
+        kind (str): 归档类型，'zip'、'tar' 或 'gzip'
+        archive_path (str): 归档文件路径，用于忽略规则匹配
+        rel_path (str): 归档文件相对统计目录的路径，用于详细列表
+        depth (int): 剩余可展开的归档层数
+        ignore_patterns (set): 忽略模式
+        on_member (callable): 处理普通成员的回调，参数为
+            (成员路径, 成员相对路径, 大小, 修改时间, 二进制流)
+        archive_size (int): 归档文件本身的大小，单文件gzip以此作为成员大小
+        on_skipped (callable): 记录无法展开的嵌套归档的回调，参数为 (成员相对路径, 原因)
+    """
+    import gzip
+    import tarfile
+    import time
+    import zipfile
+    
+    def handle(name, size, mtime, stream):
+        parts = [p for p in name.replace('\\', '/').split('/') if p and p != '.']
+        if not parts:
+            return
+        # 成员所在的目录按与os.walk相同的规则排除
+        for i, part in enumerate(parts[:-1]):
+            if (part.startswith('.') or part in EXCLUDE_DIRS
+                    or should_ignore(archive_path + ARCHIVE_SEPARATOR + '/'.join(parts[:i + 1]), ignore_patterns)):
+                return
+        
+        member_name = '/'.join(parts)
+        member_path = archive_path + ARCHIVE_SEPARATOR + member_name
+        rel_member_path = rel_path + ARCHIVE_SEPARATOR + member_name
+        nested_kind = archive_kind(parts[-1])
+        if nested_kind:
+            if depth <= 1 or is_excluded_file(parts[-1], member_path, ignore_patterns, check_extension=False):
+                return
+            if nested_kind == 'zip':
+                # zip需要随机访问，嵌套时在内存中缓冲
+                stream = read_into_memory(stream, ARCHIVE_BUFFER_LIMIT)
+                if stream is None:
+                    if on_skipped:
+                        on_skipped(rel_member_path, f"嵌套zip超过{ARCHIVE_BUFFER_LIMIT // (1024 * 1024)}MB")
+                    return
+            try:
+                scan_archive(stream, nested_kind, member_path, rel_member_path,
+                             depth - 1, ignore_patterns, on_member, size, on_skipped)
+            except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError):
+                pass
+            return
+        
+        if is_excluded_file(parts[-1], member_path, ignore_patterns):
+            return
+        on_member(member_path, rel_member_path, size, mtime, stream)
+    
+    if kind == 'zip':
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if info.filename.endswith('/'):
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                try:
+                    with zf.open(info) as member:
+                        handle(info.filename, info.file_size, mtime, member)
+                except (OSError, EOFError, RuntimeError, NotImplementedError, zipfile.BadZipFile):
+                    continue
+    elif kind == 'tar':
+        # 使用流模式读取，不缓存成员列表，内存占用与归档大小无关
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tf:
+            for info in tf:
+                if not info.isfile():
+                    continue
+                handle(info.name, info.size, info.mtime, tf.extractfile(info))
+    elif kind == 'gzip':
+        # 单文件gzip没有成员列表，成员名为去掉.gz后缀的文件名，大小按压缩后大小计算
+        name = os.path.basename(archive_path.split(ARCHIVE_SEPARATOR)[-1])[:-len('.gz')]
+        member = gzip.GzipFile(fileobj=fileobj)
+        member.peek(1)  # 读取gzip头部以获得原始修改时间
+        handle(name, archive_size, member.mtime or 0, member)
+
+def walk_shard(directory, shard=None, ignore_patterns=(), skip_subtrees=()):
+    """
+    按排除规则遍历目录，逐个返回 (所在目录, 文件名列表)
+    
+    shard 为None时遍历整个目录；'dir' 分片只遍历一个顶层子目录，'root' 分片只包含
+    根目录下的文件，'hash' 分片不遍历目录，按协调节点列出的文件（相对路径）所在目录分组返回。
+    skip_subtrees 中的目录（相对路径）及其子目录不会被遍历。
+    """
+    kind = shard['kind'] if shard else None
+    if kind == 'hash':
+        by_dir = defaultdict(list)
+        for path in shard['files']:
+            parent, _, name = path.rpartition('/')
+            by_dir[parent].append(name)
+        for parent, files in by_dir.items():
+            yield (os.path.join(directory, parent.replace('/', os.sep)) if parent else directory), files
+        return
+    
+    start = os.path.join(directory, shard['path']) if kind == 'dir' else directory
+    for root, dirs, files in os.walk(start):
+        # 移除需要排除的目录
+        prune_dirs(root, dirs, ignore_patterns)
+        if skip_subtrees:
+            dirs[:] = [d for d in dirs if relative_path(os.path.join(root, d), directory) not in skip_subtrees]
+        if kind == 'root':
+            dirs[:] = []
+        yield root, files
+
+def relative_path(path, directory):
+    """返回相对统计目录、以/分隔的路径"""
+    return os.path.relpath(path, directory).replace(os.sep, '/')
+
+def scan_tree(directory='.', scan_archives=False, archive_depth=DEFAULT_ARCHIVE_DEPTH, progress=None,
+              collect_files=False, skip_generated=True, shard=None, ignore_patterns=None, journal=None,
+              clone_index=None, metrics=False):
+    """
+    扫描目录并返回统计结果，不输出任何内容
+    
+    Args:
+        directory (str): 要统计的目录路径
+        scan_archives (bool): 是否直接读取zip/tar/gz归档文件中的内容
+        archive_depth (int): 归档文件最多展开的嵌套层数
+        progress (ProgressReporter): 进度报告器，为None时不输出进度
+        collect_files (bool): 是否收集逐文件的统计记录
+        skip_generated (bool): 是否根据文件开头的内容跳过生成文件和压缩文件
+        shard (dict): 只扫描该分片内的文件，见 make_shards()
+        ignore_patterns (set): 忽略模式，为None时从 .codeignore 加载
+        journal (ScanJournal): 检查点日志，指定时逐目录记录结果，并跳过日志中已完成的目录
+        clone_index (CloneIndex): 重复代码指纹索引，指定时在同一遍读取中计算代码行指纹
+        metrics (bool): 是否在同一遍读取中计算函数数、嵌套深度和长行等代码度量
+    
+    Returns:
+        tuple: (各语言行数统计, 文件统计信息)
+    """
+    import io
+    import tarfile
+    import zipfile
+    from itertools import chain
+    
+    # 用于存储每种语言的行数
+    language_counts = defaultdict(int)
+    file_stats = {
+        'total_files': 0,
+        'total_size': 0,
+        'files': [],
+    }
+    
+    # 加载忽略模式
+    if ignore_patterns is None:
+        ignore_patterns = load_ignore_patterns()
+    
+    # 启用检查点时每个目录的结果先记在单独的字典中，写入日志后再合并到总数里
+    totals = (language_counts, file_stats)
+    skip_subtrees = ()
+    open_dirs = []
+    if journal:
+        merge_results(language_counts, file_stats, journal.language_counts, journal.file_stats)
+        skip_subtrees = journal.done_subtrees
+    
+    def count_lines(text_lines, ext):
+        # 按需在统计行数的同时计算代码度量和每个代码行的哈希，文件只读取一遍
+        if metrics:
+            hashes = [] if clone_index is not None else None
+            lines, file_metrics = count_code_metrics(text_lines, ext, hashes)
+            return lines, hashes, file_metrics
+        if clone_index is not None:
+            return count_code_lines_hashed(text_lines, ext) + (None,)
+        return count_code_lines(text_lines, ext), None, None
+    
+    def skip_archive_member(rel_member_path, reason):
+        record_skipped(file_stats, rel_member_path, reason, collect_files)
+    
+    def count_archive_member(member_path, rel_member_path, size, mtime, stream):
+        ext = os.path.splitext(member_path)[1].lower()
+        try:
+            language = EXTENSION_MAP.get(ext)
+            lines = 0
+            hashes = file_metrics = None
+            if language:
+                head = stream.read(GENERATED_SNIFF_SIZE)
+                reason = detect_generated(head.decode('utf-8', 'ignore')) if skip_generated else None
+                if reason:
+                    record_skipped(file_stats, rel_member_path, reason, collect_files)
+                    return
+                # tar流模式下的成员对象不支持TextIOWrapper，逐行解码
+                head += stream.readline()
+                lines, hashes, file_metrics = count_lines(
+                    (raw.decode('utf-8') for raw in chain(io.BytesIO(head), stream)), ext)
+            record_file(language_counts, file_stats, rel_member_path, size, mtime,
+                        language, lines, collect_files, file_metrics)
+            if hashes:
+                clone_index.add_file(rel_member_path, language, hashes)
+        except Exception:
+            return
+    
+    # 遍历指定目录及其子目录
+    for root, files in walk_shard(directory, shard, ignore_patterns, skip_subtrees):
+        if progress:
+            progress.current_dir = root
+        
+        if journal:
+            rel_root = relative_path(root, directory)
+            # 遍历是深度优先的，离开一个目录时它的整个子树都已完成
+            while open_dirs and not is_subpath(rel_root, open_dirs[-1]):
+                journal.record_subtree(open_dirs.pop())
+            open_dirs.append(rel_root)
+            if rel_root in journal.done_dirs:
+                continue
+            language_counts = defaultdict(int)
+            file_stats = {'total_files': 0, 'total_size': 0, 'files': []}
+        
+        for file in files:
+            file_path = os.path.join(root, file)
+            
+            kind = archive_kind(file) if scan_archives else None
+            if kind:
+                if is_excluded_file(file, file_path, ignore_patterns, check_extension=False):
+                    continue
+                archive_size = 0
+                try:
+                    archive_size = os.path.getsize(file_path)
+                    with open(file_path, 'rb') as f:
+                        scan_archive(f, kind, file_path, relative_path(file_path, directory),
+                                     archive_depth, ignore_patterns, count_archive_member,
+                                     archive_size, skip_archive_member)
+                except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError):
+                    pass
+                if progress:
+                    progress.advance(archive_size)
+                continue
+            
+            if is_excluded_file(file, file_path, ignore_patterns):
+                continue
+                
+            try:
+                file_size = os.path.getsize(file_path)
+                file_mtime = os.path.getmtime(file_path)
+                
+                ext = os.path.splitext(file)[1].lower()
+                language = EXTENSION_MAP.get(ext)
+                lines = 0
+                hashes = file_metrics = None
+                reason = None
+                if language:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        # 先只读开头判断是否为生成/压缩文件，是则不再读取剩余内容
+                        head = f.read(GENERATED_SNIFF_SIZE)
+                        reason = detect_generated(head) if skip_generated else None
+                        if not reason:
+                            head += f.readline()
+                            lines, hashes, file_metrics = count_lines(chain(io.StringIO(head), f), ext)
+                
+                if reason:
+                    record_skipped(file_stats, relative_path(file_path, directory), reason, collect_files)
+                else:
+                    record_file(language_counts, file_stats, relative_path(file_path, directory),
+                                file_size, file_mtime, language, lines, collect_files, file_metrics)
+                    if hashes:
+                        clone_index.add_file(relative_path(file_path, directory), language, hashes)
+                if progress:
+                    progress.advance(file_size)
+                
+            except Exception:
+                continue
+        
+        if journal:
+            journal.record_dir(rel_root, language_counts, file_stats)
+            merge_results(*totals, language_counts, file_stats)
+    
+    if journal:
+        while open_dirs:
+            journal.record_subtree(open_dirs.pop())
+        language_counts, file_stats = totals
+    
+    return language_counts, file_stats
+
+def is_subpath(path, parent):
+    """判断以/分隔的相对路径path是否位于parent之下（含parent本身）"""
+    return parent == '.' or path == parent or path.startswith(parent + '/')
+
+class ScanJournal:
+    """
+    扫描检查点日志，每行一条JSON记录，只追加写入
+    
+    日志第一行记录统计目录和选项，之后每处理完一个目录写一条 dir 记录（含该目录
+    下文件的统计结果），离开一个目录的子树时写一条 subtree 记录。写入按时间间隔
+    批量fsync，进程被中断时最多丢失最后一个间隔内的记录，恢复时这些目录会重新统计。
+    """
+    
+    def __init__(self, path, directory, options, resume=False):
+        """
+        Args:
+            path (str): 日志文件路径
+            directory (str): 统计目录
+            options (dict): 影响统计结果的选项，恢复时必须与日志中的一致
+            resume (bool): 是否从已有日志继续，为False时覆盖已有日志
+        """
+        import json
+        import time
+        
+        self.path = path
+        self.language_counts = defaultdict(int)
+        self.file_stats = {'total_files': 0, 'total_size': 0, 'files': []}
+        self.done_dirs = set()
+        self.done_subtrees = set()
+        header = {'type': 'start', 'version': CHECKPOINT_VERSION,
+                  'directory': os.path.abspath(directory), 'options': options}
+        
+        if resume and os.path.exists(path):
+            self.load(header)
+            self.file = open(path, 'a', encoding='utf-8')
+        else:
+            if resume:
+                print(f"⚠️ 检查点 '{path}' 不存在，将从头开始统计")
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file = open(path, 'w', encoding='utf-8')
+            self.file.write(json.dumps(header, ensure_ascii=False) + '\n')
+            self.sync()
+        self.last_sync = time.monotonic()
+    
+    def load(self, header):
+        """读取已有日志，恢复已完成的目录和部分统计结果"""
+        import json
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # 中断时可能留下写了一半的最后一行
+                break
+        if not records or records[0] != header:
+            raise ValueError(f"检查点 '{self.path}' 与当前的统计目录或参数不一致，无法恢复")
+        
+        for record in records[1:]:
+            if record['type'] == 'dir':
+                self.done_dirs.add(record['path'])
+                merge_results(self.language_counts, self.file_stats,
+                              record.get('language_counts', {}), record.get('file_stats', {}))
+            elif record['type'] == 'subtree':
+                self.done_subtrees.add(record['path'])
+        
+        # 截掉可能不完整的最后一行，保证之后追加的记录从新的一行开始
+        valid = sum(len(line.encode('utf-8')) + 1 for line in lines[:len(records)])
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, 2)
+            f.truncate(min(valid, size))
+            if size < valid:
+                f.write(b'\n')
+        print(f"从检查点恢复：已完成 {len(self.done_dirs)} 个目录，"
+              f"{self.file_stats['total_files']} 个文件")
+    
+    def write(self, record):
+        import json
+        import time
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if time.monotonic() - self.last_sync >= CHECKPOINT_SYNC_INTERVAL:
+            self.sync()
+            self.last_sync = time.monotonic()
+    
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+    
+    def record_dir(self, path, language_counts, file_stats):
+        record = {'type': 'dir', 'path': path}
+        if file_stats['total_files'] or file_stats.get('skipped'):
+            record['language_counts'] = language_counts
+            record['file_stats'] = file_stats
+        self.write(record)
+    
+    def record_subtree(self, path):
+        self.write({'type': 'subtree', 'path': path})
+    
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+class CloneIndex:
+    """
+    基于滚动哈希和winnowing的重复代码指纹索引
+    
+    每个文件的代码行先各自哈希，再以 CLONE_WINDOW_LINES 行为窗口计算滚动哈希，
+    用winnowing从每 CLONE_WINNOW_WINDOW 个相邻窗口中选出最小的哈希作为指纹，
+    写入指纹 -> [(文件编号, 代码行下标), ...] 的倒排索引。索引中有指纹的文件还保存
+    行哈希和行号（每个代码行8字节），汇总时从出现在两处及以上的指纹出发，逐行比较
+    行哈希向前后扩展到完整的重复代码段。
+    
+    索引记录和行哈希的估计内存合计超过 max_bytes 时，只保留哈希值能被 modulus 整除的
+    指纹并把 modulus 加倍，不再有指纹的文件同时丢弃行哈希。这样的抽样对所有文件一致，
+    相同的代码仍会选出相同的指纹。
+    """
+    
+    HASH_MODULUS = (1 << 61) - 1
+    HASH_BASE = 1000003
+    
+    def __init__(self, window=CLONE_WINDOW_LINES, winnow=CLONE_WINNOW_WINDOW, max_bytes=CLONE_MAX_BYTES):
+        self.window = window
+        self.winnow = winnow
+        self.max_bytes = max_bytes
+        self.modulus = 1
+        self.files = []
+        # 没有指纹留在索引中的文件对应 None
+        self.line_hashes = []
+        self.line_numbers = []
+        self.index = defaultdict(list)
+        self.postings = 0
+        self.lines = 0
+        self.base_power = pow(self.HASH_BASE, window - 1, self.HASH_MODULUS)
+    
+    def fingerprints(self, hashes):
+        """返回winnowing选出的 (指纹, 窗口起始下标) 列表"""
+        from collections import deque
+        if len(hashes) < self.window:
+            return []
+        
+        # 窗口滚动哈希 h = sum(x_i * B^(k-1-i)) mod M，同时用单调队列维护最近
+        # winnow 个窗口中的最小值（相同时取最右边的）
+        modulus, base, window, winnow = self.HASH_MODULUS, self.HASH_BASE, self.window, self.winnow
+        windows = []
+        queue = deque()
+        selected = []
+        last = -1
+        h = 0
+        for i, (line_hash, _) in enumerate(hashes):
+            if i >= window:
+                h = (h - hashes[i - window][0] * self.base_power) % modulus
+            h = (h * base + line_hash) % modulus
+            position = i - window + 1
+            if position < 0:
+                continue
+            windows.append(h)
+            while queue and windows[queue[-1]] >= h:
+                queue.pop()
+            queue.append(position)
+            if queue[0] <= position - winnow:
+                queue.popleft()
+            if position >= winnow - 1 and queue[0] != last:
+                last = queue[0]
+                selected.append((windows[last], last))
+        if not selected:
+            selected.append((windows[queue[0]], queue[0]))
+        return selected
+    
+    def add_file(self, path, language, hashes):
+        """
+        把一个文件的代码行哈希加入索引
+        
+        Args:
+            path (str): 文件相对路径
+            language (str): 语言
+            hashes (list): count_code_lines_hashed() 返回的 [(行哈希, 行号), ...]
+        """
+        from array import array
+        from operator import itemgetter
+        
+        file_id = len(self.files)
+        self.files.append((path, language, len(hashes)))
+        added = 0
+        for fingerprint, position in self.fingerprints(hashes):
+            if fingerprint % self.modulus:
+                continue
+            self.index[fingerprint].append((file_id, position))
+            added += 1
+        
+        # 重复代码段都从索引中的指纹出发扩展，没有指纹的文件不需要保存行哈希
+        if added:
+            self.line_hashes.append(array('I', map(itemgetter(0), hashes)))
+            self.line_numbers.append(array('I', map(itemgetter(1), hashes)))
+            self.postings += added
+            self.lines += len(hashes)
+        else:
+            self.line_hashes.append(None)
+            self.line_numbers.append(None)
+        
+        while self.postings * CLONE_POSTING_BYTES + self.lines * CLONE_LINE_BYTES > self.max_bytes:
+            self.modulus *= 2
+            self.index = defaultdict(list, ((fp, postings) for fp, postings in self.index.items()
+                                            if fp % self.modulus == 0))
+            self.postings = sum(len(postings) for postings in self.index.values())
+            indexed = {file_id for postings in self.index.values() for file_id, _ in postings}
+            for file_id, line_hashes in enumerate(self.line_hashes):
+                if line_hashes is not None and file_id not in indexed:
+                    self.line_hashes[file_id] = self.line_numbers[file_id] = None
+                    self.lines -= len(line_hashes)
+    
+    def report(self, top=CLONE_REPORT_TOP):
+        """
+        汇总重复代码
+        
+        Returns:
+            dict: languages（语言 -> (代码行, 重复行)）、dirs（目录 -> (代码行, 重复行)，
+                按重复行取前 top 个）、groups（按重复行数排序的前 top 个重复代码组，
+                每组包含 lines（代码行数）和 instances: [(路径, 起始行, 结束行), ...]）以及 sampling（抽样模数）
+        """
+        # 指纹相同的各处按对齐方式（所在文件和相对第一处的偏移）分组。同一文件中
+        # 相距不到一个窗口的位置只保留前一个，避免同一段代码和自身重叠
+        alignments = defaultdict(list)
+        for fingerprint, postings in self.index.items():
+            if len(postings) < 2:
+                continue
+            kept = []
+            for file_id, position in sorted(postings):
+                if not kept or kept[-1][0] != file_id or position - kept[-1][1] >= self.window:
+                    kept.append((file_id, position))
+            if len(kept) < 2:
+                continue
+            first = kept[0][1]
+            alignments[tuple((file_id, position - first) for file_id, position in kept)].append(first)
+        
+        # 从尚未被同组已有重复段覆盖的指纹出发，逐行比较行哈希向后、向前扩展
+        intervals = defaultdict(list)
+        clones = []
+        for alignment, firsts in alignments.items():
+            arrays = [self.line_hashes[file_id] for file_id, _ in alignment]
+            limit = min((b[1] - a[1] for a, b in zip(alignment, alignment[1:]) if a[0] == b[0]),
+                        default=len(arrays[0]))
+            covered_to = -1
+            for first in sorted(firsts):
+                if first + self.window <= covered_to:
+                    continue
+                starts = [first + offset for _, offset in alignment]
+                after = min(min(len(h) - start for h, start in zip(arrays, starts)), limit)
+                before = min(starts)
+                
+                forward = 0
+                while forward < after and len({h[start + forward] for h, start in zip(arrays, starts)}) == 1:
+                    forward += 1
+                if forward < self.window:
+                    continue  # 指纹碰撞
+                backward = 0
+                while (backward < before and forward + backward < limit
+                       and len({h[start - backward - 1] for h, start in zip(arrays, starts)}) == 1):
+                    backward += 1
+                covered_to = first + forward
+                
+                length = forward + backward
+                instances = []
+                for (file_id, _), start in zip(alignment, starts):
+                    start -= backward
+                    intervals[file_id].append((start, start + length))
+                    numbers = self.line_numbers[file_id]
+                    instances.append((self.files[file_id][0], numbers[start], numbers[start + length - 1]))
+                clones.append({'lines': length, 'instances': sorted(instances)})
+        
+        languages = defaultdict(lambda: [0, 0])
+        dirs = defaultdict(lambda: [0, 0])
+        duplicated = {}
+        for file_id, spans in intervals.items():
+            covered = end = 0
+            for start, stop in sorted(spans):
+                start = max(start, end)
+                if stop > start:
+                    covered += stop - start
+                    end = stop
+            duplicated[file_id] = covered
+        for file_id, (path, language, code_lines) in enumerate(self.files):
+            dup = duplicated.get(file_id, 0)
+            languages[language][0] += code_lines
+            languages[language][1] += dup
+            parent = path.rpartition('/')[0] or '.'
+            dirs[parent][0] += code_lines
+            dirs[parent][1] += dup
+        
+        clones.sort(key=lambda g: (-g['lines'] * (len(g['instances']) - 1), g['instances']))
+        
+        return {
+            'languages': {k: tuple(v) for k, v in languages.items()},
+            'dirs': dict(sorted(((k, tuple(v)) for k, v in dirs.items() if v[1]),
+                                key=lambda item: (-item[1][1], item[0]))[:top]),
+            'groups': clones[:top],
+            'sampling': self.modulus,
+        }
+
+def print_clones(clones):
+    """打印重复代码统计"""
+    def ratio(code, dup):
+        return dup / code if code else 0
+    
+    print("\n重复代码统计:")
+    if clones['sampling'] > 1:
+        print(f"（指纹索引超过内存上限，按 1/{clones['sampling']} 抽样，结果为下限估计）")
+    print("-" * 40)
+    print(f"{'语言':<15}{'代码行':>10}{'重复行':>10}{'比例':>8}")
+    print("-" * 40)
+    for language, (code, dup) in sorted(clones['languages'].items()):
+        print(f"{language:<15}{code:>10}{dup:>10}{ratio(code, dup):>8.1%}")
+    total_code = sum(code for code, _ in clones['languages'].values())
+    total_dup = sum(dup for _, dup in clones['languages'].values())
+    print("-" * 40)
+    print(f"{'总计':<15}{total_code:>10}{total_dup:>10}{ratio(total_code, total_dup):>8.1%}")
+    
+    if clones['dirs']:
+        print(f"\n重复行最多的目录:")
+        for directory, (code, dup) in clones['dirs'].items():
+            print(f"{dup:>10}  {ratio(code, dup):>6.1%}  {directory}")
+    
+    if clones['groups']:
+        print(f"\n最大的重复代码组:")
+        for i, group in enumerate(clones['groups'], 1):
+            print(f"{i:>3}. {group['lines']} 行 × {len(group['instances'])} 处")
+            for path, start, end in group['instances']:
+                print(f"       {path}:{start}-{end}")
+
+def merge_results(language_counts, file_stats, other_counts, other_stats):
+    """将另一份扫描结果（例如一个分片的结果）合并到汇总数据中"""
+    for language, lines in other_counts.items():
+        language_counts[language] += lines
+    for key, value in other_stats.items():
+        if key in ('total_files', 'total_size'):
+            file_stats[key] += value
+        elif key in ('files', 'skipped_files'):
+            file_stats.setdefault(key, []).extend(value)
+        elif key == 'skipped':
+            skipped = file_stats.setdefault('skipped', {})
+            for reason, count in value.items():
+                skipped[reason] = skipped.get(reason, 0) + count
+        elif key == 'metrics':
+            aggregates = file_stats.setdefault('metrics', {'languages': {}, 'dirs': {}})
+            for section in ('languages', 'dirs'):
+                for name, metrics in value[section].items():
+                    merge_metrics(aggregates[section].setdefault(name, {}), metrics)
+        else:
+            stats = file_stats.setdefault(key, {'files': 0, 'size': 0})
+            stats['files'] += value['files']
+            stats['size'] += value['size']
+
+def report_results(directory, language_counts, file_stats, detailed=False, snapshot=None, attribution=None,
+                   clones=None):
+    """打印统计结果并保存HTML报告，指定时写入扫描快照"""
+    print_results(language_counts, file_stats)
+    print_skipped(file_stats)
+    print_metrics(file_stats)
+    if attribution:
+        print_authors(attribution)
+    if clones:
+        print_clones(clones)
+    
+    # 保存结果到日志文件
+    save_to_log(directory, language_counts, sum(language_counts.values()), file_stats, detailed,
+                attribution=attribution, clones=clones)
+    
+    if snapshot:
+        write_snapshot(snapshot, file_stats['files'])
+        print(f"📦 扫描快照已保存到: {snapshot}")
+
+def count_lines_by_extension(directory='.', detailed=False, scan_archives=False,
+                             archive_depth=DEFAULT_ARCHIVE_DEPTH, progress=None, snapshot=None,
+                             skip_generated=True, authors=False, jobs=None, checkpoint=None, resume=False,
+                             clones=False, metrics=False):
+    """
+    统计指定目录下各种编程语言的代码行数
+    
+    Args:
+        directory (str): 要统计的目录路径
+        detailed (bool): 是否记录详细的文件列表
+        scan_archives (bool): 是否直接读取zip/tar/gz归档文件中的内容
+        archive_depth (int): 归档文件最多展开的嵌套层数
+        progress (ProgressReporter): 进度报告器，为None时不输出进度
+        snapshot (str): 快照文件路径，指定时将逐文件统计结果写入快照
+        skip_generated (bool): 是否根据文件开头的内容跳过生成文件和压缩文件
+        authors (bool): 是否按git blame统计各作者和团队的代码行数
+        jobs (int): 并行运行git blame的进程数，为None时使用CPU核数
+        checkpoint (str): 检查点日志路径，指定时定期记录已完成的目录
+        resume (bool): 是否从检查点日志继续之前中断的统计
+        clones (bool): 是否检测重复代码
+        metrics (bool): 是否计算函数数、最大嵌套深度和长行等代码度量
+    
+    Returns:
+        tuple: (各语言行数统计, 文件统计信息)
+    """
+    # 写快照和作者统计需要逐文件的记录，即使不输出详细列表也要收集
+    collect_files = detailed or bool(snapshot) or authors
+    journal = None
+    if checkpoint:
+        ignore_patterns = load_ignore_patterns()
+        options = {
+            'scan_archives': scan_archives,
+            'archive_depth': archive_depth,
+            'skip_generated': skip_generated,
+            'collect_files': collect_files,
+            'metrics': metrics,
+            'ignore_patterns': sorted(ignore_patterns),
+        }
+        journal = ScanJournal(checkpoint, directory, options, resume)
+        if progress:
+            # 跳过的生成文件也计入进度；跳过文件的大小没有记录，字节数略偏小
+            resumed = journal.file_stats
+            progress.add_resumed(resumed['total_files'] + sum(resumed.get('skipped', {}).values()),
+                                 resumed['total_size'])
+    clone_index = CloneIndex() if clones else None
+    try:
+        language_counts, file_stats = scan_tree(directory, scan_archives, archive_depth, progress,
+                                                collect_files, skip_generated, journal=journal,
+                                                clone_index=clone_index, metrics=metrics)
+    except KeyboardInterrupt:
+        if journal:
+            print(f"\n进度已保存到检查点 '{checkpoint}'，可以加上 --resume 继续统计")
+        raise
+    finally:
+        if journal:
+            journal.close()
+    file_stats['files'].sort(key=lambda x: x['path'])
+    attribution = attribute_authors(directory, file_stats['files'], jobs) if authors else None
+    report_results(directory, language_counts, file_stats, detailed, snapshot, attribution,
+                   clone_index.report() if clone_index else None)
+    return language_counts, file_stats
+
+def load_team_rules():
+    """加载作者到团队的映射规则，返回 [(通配模式, 团队名), ...]"""
+    rules = []
+    if os.path.exists(TEAMS_FILE):
+        with open(TEAMS_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    pattern, _, team = line.rpartition('=')
+                    rules.append((pattern.strip(), team.strip()))
+    return rules
+
+def team_of(author, rules):
+    """按映射规则查找作者所属的团队，作者名和邮箱任一匹配即可"""
+    from fnmatch import fnmatch
+    name, _, mail = author.partition(' <')
+    mail = mail.rstrip('>')
+    for pattern, team in rules:
+        if fnmatch(name, pattern) or fnmatch(mail, pattern) or fnmatch(author, pattern):
+            return team
+    return UNASSIGNED_TEAM
+
+def blame_file(directory, path, ext, head=True):
+    """
+    对HEAD或工作区中的文件运行git blame，按作者统计代码行数
+    
+    代码行的判断与 count_code_lines() 一致：非空且不是单行注释。对工作区blame时，
+    未提交的行（git记为 Not Committed Yet）归属到 UNTRACKED_AUTHOR。
+    
+    Returns:
+        dict: 作者 -> 行数，作者格式为 “名字 <邮箱>”
+    """
+    import subprocess
+    
+    revision = ['HEAD'] if head else []
+    output = subprocess.run(['git', '-C', directory, 'blame', '--line-porcelain', *revision, '--', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+    marker = SINGLE_LINE_COMMENT_MARKERS.get(ext)
+    counts = defaultdict(int)
+    name = mail = ''
+    for line in output.decode('utf-8', 'replace').split('\n'):
+        if line.startswith('\t'):
+            stripped = line[1:].strip()
+            if stripped and not (marker and stripped.startswith(marker)):
+                counts[UNTRACKED_AUTHOR if mail == 'not.committed.yet' else f"{name} <{mail}>"] += 1
+        elif line.startswith('author '):
+            name = line[len('author '):]
+        elif line.startswith('author-mail '):
+            mail = line[len('author-mail '):].strip('<>')
+    return dict(counts)
+
+def attribute_authors(directory, files, jobs=None):
+    """
+    按git blame把各文件的代码行归属到作者和团队
+    
+    blame结果按 (blob哈希, 相对仓库根目录的路径) 缓存在仓库git目录下的 BLAME_CACHE_FILE 中
+    （相同内容在不同路径下的历史不同，blame结果也不同），只统计一个子目录时也能命中
+    整个仓库的缓存；保存时只删除HEAD中已不存在的条目。只有内容相对缓存发生变化的文件
+    才会重新blame，需要blame的文件并行处理。
+    
+    归属基于HEAD中的版本；有未提交修改的文件对工作区中的内容blame（结果不缓存），
+    未提交的行和不在HEAD中的文件（未提交的文件、归档内的文件）记为 UNTRACKED_AUTHOR，
+    各作者的行数之和与统计结果一致。
+    
+    Args:
+        directory (str): 统计目录，需要位于git仓库中
+        files (list): 文件统计记录列表，即 file_stats['files']
+        jobs (int): 并行运行git blame的进程数，为None时使用CPU核数
+    
+    Returns:
+        dict: 包含 authors（作者 -> 语言 -> 行数）、teams（团队 -> 行数）、
+            commit、blamed（重新blame的文件数）和 cached（缓存命中数），
+            目录不在git仓库中时返回None
+    """
+    import json
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+    
+    try:
+        # 依次输出HEAD的提交、统计目录相对仓库根目录的前缀（以/结尾，根目录为空）和git目录
+        revision = subprocess.run(['git', '-C', directory, 'rev-parse', 'HEAD', '--show-prefix', '--git-common-dir'],
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  check=True).stdout.decode('utf-8', 'replace')
+        tree = subprocess.run(['git', '-C', directory, 'ls-tree', '-r', '-z', '--full-tree', 'HEAD'],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              check=True).stdout.decode('utf-8', 'replace')
+        changed = subprocess.run(['git', '-C', directory, 'diff', '--name-only', '-z', 'HEAD'],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 check=True).stdout.decode('utf-8', 'replace')
+    except (OSError, subprocess.CalledProcessError):
+        print("\n⚠️ 统计目录不在git仓库中或git不可用，跳过作者统计")
+        return None
+    commit, prefix, git_dir = revision.split('\n')[:3]
+    cache_file = os.path.join(directory, git_dir, BLAME_CACHE_FILE)
+    
+    # ls-tree --full-tree 和 diff 输出的都是相对仓库根目录的路径
+    blobs = {}
+    for entry in tree.split('\0'):
+        if entry:
+            meta, _, path = entry.partition('\t')
+            blobs[path] = meta.split()[2]
+    
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f).get('blobs', {})
+    except (OSError, ValueError):
+        cache = {}
+    
+    # 有未提交修改的文件，工作区内容与HEAD中的blob不同，按路径单独blame工作区
+    dirty = set(changed.split('\0'))
+    keys = {}
+    pending = {}
+    for f in files:
+        path = prefix + f['path']
+        blob = blobs.get(path)
+        if blob:
+            ext = os.path.splitext(path)[1].lower()
+            if path in dirty:
+                key = f"worktree:{path}"
+                pending[key] = (f['path'], ext, False)
+            else:
+                key = f"{blob}:{path}"
+                if key not in cache:
+                    pending[key] = (f['path'], ext, True)
+            keys[f['path']] = key
+    
+    def blame(item):
+        key, (path, ext, head) = item
+        try:
+            return key, blame_file(directory, path, ext, head)
+        except (OSError, subprocess.CalledProcessError):
+            return key, None
+    
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        for key, counts in executor.map(blame, pending.items()):
+            if counts is not None:
+                cache[key] = counts
+    
+    rules = load_team_rules()
+    authors = defaultdict(lambda: defaultdict(int))
+    teams = defaultdict(int)
+    for f in files:
+        counts = cache.get(keys.get(f['path']))
+        if counts is None:
+            counts = {UNTRACKED_AUTHOR: f['lines']}
+        for author, lines in counts.items():
+            authors[author][f['language']] += lines
+            teams[UNASSIGNED_TEAM if author == UNTRACKED_AUTHOR else team_of(author, rules)] += lines
+    
+    # 只删除HEAD中已不存在的 (blob, 路径)，本次没有统计到的子目录的缓存仍然保留；工作区的blame结果不缓存
+    current = {f"{blob}:{path}" for path, blob in blobs.items()}
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'commit': commit, 'blobs': {k: v for k, v in cache.items() if k in current}},
+                      f, ensure_ascii=False)
+    except OSError:
+        print(f"\n⚠️ 无法写入blame缓存 '{cache_file}'，下次统计将重新blame")
+    
+    return {
+        'authors': authors,
+        'teams': dict(teams),
+        'commit': commit,
+        'blamed': len(pending),
+        'cached': len(set(keys.values())) - len(pending),
+    }
+
+def print_authors(attribution):
+    """打印作者和团队的代码行数统计"""
+    total = sum(sum(by_language.values()) for by_language in attribution['authors'].values()) or 1
+    print(f"\n作者统计（基于提交 {attribution['commit'][:10]}，"
+          f"重新blame {attribution['blamed']} 个文件，缓存命中 {attribution['cached']} 个）:")
+    print("-" * 40)
+    print(f"{'作者':<30}{'行数':>10}{'占比':>8}  主要语言")
+    print("-" * 40)
+    for author, by_language in sorted(attribution['authors'].items(),
+                                      key=lambda item: (-sum(item[1].values()), item[0])):
+        lines = sum(by_language.values())
+        main_language = max(sorted(by_language), key=lambda language: by_language[language])
+        print(f"{author:<30}{lines:>10}{lines / total:>8.1%}  {main_language}")
+    
+    print(f"\n{'团队':<30}{'行数':>10}{'占比':>8}")
+    print("-" * 40)
+    for team, lines in sorted(attribution['teams'].items(), key=lambda item: (-item[1], item[0])):
+        print(f"{team:<30}{lines:>10}{lines / total:>8.1%}")
+
+def make_shards(directory, shard_by='dir', count=DEFAULT_SHARD_COUNT, ignore_patterns=()):
+    """
+    将目录划分为分片
+    
+    按目录划分时每个顶层子目录是一个分片，根目录下的文件单独作为一个分片；
+    按哈希划分时只遍历一次目录，按文件相对路径的哈希值把文件列表均匀分成 count 个分片，
+    工作节点直接读取列出的文件，不需要各自遍历整个目录。
+    """
+    import zlib
+    
+    if shard_by == 'hash':
+        shards = [{'kind': 'hash', 'files': []} for _ in range(count)]
+        for root, files in walk_shard(directory, ignore_patterns=ignore_patterns):
+            for file in files:
+                path = relative_path(os.path.join(root, file), directory)
+                shards[zlib.crc32(path.encode('utf-8')) % count]['files'].append(path)
+    else:
+        dirs = sorted(d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d)))
+        prune_dirs(directory, dirs, ignore_patterns)
+        shards = [{'kind': 'root'}] + [{'kind': 'dir', 'path': d} for d in dirs]
+    for i, shard in enumerate(shards):
+        shard['id'] = i
+    return shards
+
+def parse_address(text):
+    """将 HOST:PORT 形式的地址解析为 (host, port)"""
+    host, _, port = text.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"无效的地址: {text}")
+    return host, int(port)
+
+def send_message(sock, message):
+    """以一行JSON的形式发送一条消息"""
+    import json
+    sock.sendall((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+
+def run_worker(address, root=None):
+    """
+    工作节点：连接协调节点，循环领取分片、扫描并把结果发回，直到没有剩余分片
+    
+    Args:
+        address (tuple): 协调节点地址 (host, port)
+        root (str): 本机上统计目录的路径，为None时使用协调节点发送的路径
+    """
+    import json
+    import socket
+    import threading
+    
+    def heartbeat(sock, shard_id, stop):
+        """扫描分片期间定时发送心跳，让协调节点知道工作节点仍在运行"""
+        while not stop.wait(DISTRIBUTED_HEARTBEAT_INTERVAL):
+            try:
+                send_message(sock, {'type': 'heartbeat', 'shard': shard_id})
+            except OSError:
+                return
+    
+    with socket.create_connection(address) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        reader = sock.makefile('r', encoding='utf-8')
+        send_message(sock, {'type': 'hello', 'worker': f"{socket.gethostname()}:{os.getpid()}"})
+        for line in reader:
+            message = json.loads(line)
+            if message['type'] == 'done':
+                break
+            
+            options = message['options']
+            shard = message['shard']
+            # 目录在本机不存在时os.walk不会报错，只会得到空结果；直接失败，让协调节点重新分配该分片
+            directory = root or message['directory']
+            start = os.path.join(directory, shard['path']) if shard['kind'] == 'dir' else directory
+            if not os.path.isdir(start):
+                raise FileNotFoundError(f"工作节点上不存在目录 '{start}'，请用 --root 指定本机上的统计目录")
+            stop = threading.Event()
+            beater = threading.Thread(target=heartbeat, args=(sock, shard['id'], stop), daemon=True)
+            beater.start()
+            try:
+                language_counts, file_stats = scan_tree(
+                    directory, options['scan_archives'], options['archive_depth'],
+                    collect_files=options['collect_files'], skip_generated=options['skip_generated'],
+                    shard=shard, ignore_patterns=set(message['ignore_patterns']), metrics=options['metrics'])
+            finally:
+                # 心跳线程结束后才发送结果，避免两个线程同时写入连接
+                stop.set()
+                beater.join()
+            
+            # 逐文件记录分批发送，最后发送该分片的汇总结果
+            files = file_stats.pop('files')
+            for i in range(0, len(files), DISTRIBUTED_BATCH_SIZE):
+                send_message(sock, {'type': 'files', 'shard': shard['id'],
+                                    'files': files[i:i + DISTRIBUTED_BATCH_SIZE]})
+            send_message(sock, {'type': 'result', 'shard': shard['id'],
+                                'language_counts': language_counts, 'file_stats': file_stats})
+
+class Coordinator:
+    """
+    协调节点：把分片分配给连接上来的工作节点并合并结果
+    
+    每个连接由一个线程处理。分片的结果只有在收到 result 消息后才会提交，工作节点
+    在处理分片时断开连接，或超过 DISTRIBUTED_IDLE_TIMEOUT 秒没有发来任何消息（包括心跳），
+    该分片会重新放回队列分配给其他工作节点。
+    """
+    
+    def __init__(self, directory, shards, options, ignore_patterns):
+        import queue
+        import threading
+        
+        self.directory = directory
+        self.shards = shards
+        self.options = options
+        self.ignore_patterns = sorted(ignore_patterns)
+        self.pending = queue.Queue()
+        for shard in shards:
+            self.pending.put(shard)
+        self.results = {}
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+    
+    def serve(self, server):
+        """接受工作节点的连接，直到所有分片完成"""
+        import socket
+        import threading
+        
+        server.settimeout(0.5)
+        while not self.finished.is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+    
+    def next_shard(self):
+        """领取下一个待处理的分片，全部完成时返回None"""
+        import queue
+        while not self.finished.is_set():
+            try:
+                return self.pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+    
+    def handle(self, conn):
+        import json
+        import socket
+        
+        shard = None
+        try:
+            with conn:
+                # 对端主机宕机或网络中断时连接不一定会关闭，用保活探测和空闲超时发现失联的工作节点
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                conn.settimeout(DISTRIBUTED_IDLE_TIMEOUT)
+                reader = conn.makefile('r', encoding='utf-8')
+                hello = json.loads(reader.readline())
+                worker = hello.get('worker', '?')
+                while True:
+                    shard = self.next_shard()
+                    if shard is None:
+                        send_message(conn, {'type': 'done'})
+                        return
+                    send_message(conn, {'type': 'shard', 'shard': shard, 'directory': self.directory,
+                                        'options': self.options, 'ignore_patterns': self.ignore_patterns})
+                    files = []
+                    while True:
+                        try:
+                            line = reader.readline()
+                        except socket.timeout:
+                            raise ConnectionError(f"工作节点 {worker} 超过 {DISTRIBUTED_IDLE_TIMEOUT:g} 秒没有响应") from None
+                        if not line:
+                            raise ConnectionError(f"工作节点 {worker} 断开连接")
+                        message = json.loads(line)
+                        if message['type'] == 'files':
+                            files.extend(message['files'])
+                        elif message['type'] == 'result':
+                            break
+                    message['file_stats']['files'] = files
+                    with self.lock:
+                        self.results[shard['id']] = (message['language_counts'], message['file_stats'])
+                        if len(self.results) == len(self.shards):
+                            self.finished.set()
+                    shard = None
+        except (OSError, ValueError) as e:
+            if shard is not None:
+                print(f"\n工作节点连接中断，分片 {shard['id']} 将重新分配: {e}")
+                self.pending.put(shard)
+    
+    def merged(self):
+        """按分片编号顺序合并结果，文件记录按路径排序，保证结果与分配顺序无关"""
+        language_counts = defaultdict(int)
+        file_stats = {
+            'total_files': 0,
+            'total_size': 0,
+            'files': [],
+        }
+        for shard_id in sorted(self.results):
+            merge_results(language_counts, file_stats, *self.results[shard_id])
+        file_stats['files'].sort(key=lambda x: x['path'])
+        if 'skipped_files' in file_stats:
+            file_stats['skipped_files'].sort(key=lambda x: x['path'])
+        return language_counts, file_stats
+
+def run_coordinator(directory, address, local_workers=0, shard_by='dir', shard_count=DEFAULT_SHARD_COUNT,
+                    detailed=False, scan_archives=False, archive_depth=DEFAULT_ARCHIVE_DEPTH,
+                    snapshot=None, skip_generated=True, metrics=False):
+    """
+    以协调节点模式统计目录：划分分片，等待工作节点领取并合并结果
+    
+    Args:
+        directory (str): 要统计的目录路径，工作节点需要能以相同路径（或 --root 指定的路径）访问
+        address (tuple): 监听地址 (host, port)，端口为0时自动选择
+        local_workers (int): 在本机启动的工作进程数
+        shard_by (str): 分片方式，'dir' 按顶层目录，'hash' 按路径哈希
+        shard_count (int): 按哈希划分时的分片数
+        其余参数与 count_lines_by_extension() 相同
+    
+    Returns:
+        tuple: (各语言行数统计, 文件统计信息)
+    """
+    import socket
+    import subprocess
+    import threading
+    import time
+    
+    ignore_patterns = load_ignore_patterns()
+    shards = make_shards(directory, shard_by, shard_count, ignore_patterns)
+    options = {
+        'scan_archives': scan_archives,
+        'archive_depth': archive_depth,
+        'skip_generated': skip_generated,
+        'collect_files': detailed or bool(snapshot),
+        'metrics': metrics,
+    }
+    # 工作节点在各自的工作目录下运行，发送绝对路径
+    coordinator = Coordinator(os.path.abspath(directory), shards, options, ignore_patterns)
+    
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(address)
+        server.listen()
+        host, port = server.getsockname()[:2]
+        print(f"协调节点监听 {host}:{port}，共 {len(shards)} 个分片")
+        
+        acceptor = threading.Thread(target=coordinator.serve, args=(server,), daemon=True)
+        acceptor.start()
+        
+        workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker',
+                                     '--connect', f"{host}:{port}"])
+                   for _ in range(local_workers)]
+        try:
+            while not coordinator.finished.wait(0.5):
+                if workers and all(w.poll() is not None for w in workers):
+                    raise RuntimeError("所有本地工作进程都已退出，仍有分片未完成")
+        finally:
+            coordinator.finished.set()
+            for worker in workers:
+                try:
+                    worker.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    worker.kill()
+            acceptor.join()
+    
+    language_counts, file_stats = coordinator.merged()
+    report_results(directory, language_counts, file_stats, detailed, snapshot)
+    return language_counts, file_stats
+
+def size_bucket(size):
+    """将文件大小映射到按4倍递增的大小区间编号"""
+    bucket = 0
+    while size >= 1024:
+        size //= 4
+        bucket += 1
+    return bucket
+
+def estimate_lines_by_extension(directory='.', budget=DEFAULT_ESTIMATE_BUDGET, skip_generated=True):
+    """
+    抽样估算指定目录下各语言的代码行数
+    
+    先只读取元数据遍历目录，记录每个文件的大小和扩展名；然后按（语言, 大小区间）
+    分层随机抽样读取文件，在时间预算内尽量多读，最后用分层抽样估计量外推各语言
+    的行数并给出置信区间。文件数和大小来自元数据遍历，是精确值。
+    
+    每个分层至少读取一个文件，即使元数据遍历已经用完了时间预算。只抽到一个文件的
+    分层无法计算方差，借用其他分层的合并变异系数（没有可用分层时按1保守估计）；
+    无法读取的文件按0行计入样本。
+    
+    抽到的生成文件和压缩文件按0行计入样本，并从文件数和大小中扣除；未抽到的生成
+    文件无法识别，仍计入文件数和大小。
+    
+    Args:
+        directory (str): 要统计的目录路径
+        budget (float): 整个估算过程的时间预算（秒）
+        skip_generated (bool): 是否根据抽样文件开头的内容跳过生成文件和压缩文件
+    """
+    import heapq
+    import io
+    import math
+    import random
+    import time
+    from itertools import chain
+    
+    started = time.monotonic()
+    deadline = started + budget
+    
+    file_stats = {
+        'total_files': 0,
+        'total_size': 0,
+        'files': [],
+    }
+    ignore_patterns = load_ignore_patterns()
+    
+    # 元数据遍历：(语言, 大小区间) -> [(文件路径, 扩展名, 文件大小), ...]
+    strata = defaultdict(list)
+    for root, dirs, files in os.walk(directory):
+        prune_dirs(root, dirs, ignore_patterns)
+        
+        for file in files:
+            file_path = os.path.join(root, file)
+            if is_excluded_file(file, file_path, ignore_patterns):
+                continue
+            try:
+                file_size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            
+            ext = os.path.splitext(file)[1].lower()
+            language = EXTENSION_MAP.get(ext)
+            if language:
+                if language not in file_stats:
+                    file_stats[language] = {'files': 0, 'size': 0}
+                file_stats[language]['files'] += 1
+                file_stats[language]['size'] += file_size
+                strata[(language, size_bucket(file_size))].append((file_path, ext, file_size))
+            
+            file_stats['total_files'] += 1
+            file_stats['total_size'] += file_size
+    
+    # 抽样：每个分层先随机打乱，优先补齐样本数少于2的分层，其余按已抽样比例最低者优先
+    rng = random.Random()
+    samples = {}
+    heap = []
+    for key, members in strata.items():
+        rng.shuffle(members)
+        samples[key] = [0, 0, 0]  # 样本数, 行数和, 行数平方和
+        heapq.heappush(heap, ((False, False, 0.0), key))
+    
+    sampled_files = 0
+    while heap:
+        (has_one, _, _), key = heapq.heappop(heap)
+        if has_one and time.monotonic() >= deadline:
+            break
+        
+        members = strata[key]
+        sample = samples[key]
+        file_path, ext, file_size = members[sample[0]]
+        lines = 0
+        reason = None
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                head = f.read(GENERATED_SNIFF_SIZE)
+                reason = detect_generated(head) if skip_generated else None
+                if not reason:
+                    head += f.readline()
+                    lines = count_code_lines(chain(io.StringIO(head), f), ext)
+        except Exception:
+            lines = 0
+        if reason:
+            record_skipped(file_stats, relative_path(file_path, directory), reason)
+            file_stats[key[0]]['files'] -= 1
+            file_stats[key[0]]['size'] -= file_size
+            file_stats['total_files'] -= 1
+            file_stats['total_size'] -= file_size
+        sample[0] += 1
+        sample[1] += lines
+        sample[2] += lines * lines
+        sampled_files += 1
+        
+        if sample[0] < len(members):
+            heapq.heappush(heap, ((True, sample[0] >= 2, sample[0] / len(members)), key))
+    
+    def sample_variance(n, total, total_sq):
+        mean = total / n
+        return max(total_sq - n * mean * mean, 0) / (n - 1)
+    
+    # 合并变异系数的平方，用于只有一个样本的分层
+    pooled_var = pooled_mean_sq = 0.0
+    for n, total, total_sq in samples.values():
+        if n >= 2:
+            pooled_var += sample_variance(n, total, total_sq)
+            pooled_mean_sq += (total / n) ** 2
+    pooled_cv2 = pooled_var / pooled_mean_sq if pooled_mean_sq else 1.0
+    
+    # 外推：总数 = N * 均值，方差 = N^2 * (1 - n/N) * s^2 / n
+    language_counts = defaultdict(int)
+    variances = defaultdict(float)
+    for key, members in strata.items():
+        language = key[0]
+        population = len(members)
+        n, total, total_sq = samples[key]
+        mean = total / n
+        if n >= 2:
+            sample_var = sample_variance(n, total, total_sq)
+        else:
+            sample_var = pooled_cv2 * mean * mean
+        language_counts[language] += population * mean
+        variances[language] += population * population * (1 - n / population) * sample_var / n
+    
+    margins = {language: int(round(ESTIMATE_Z * math.sqrt(var))) for language, var in variances.items()}
+    margins[None] = int(round(ESTIMATE_Z * math.sqrt(sum(variances.values()))))
+    for language in language_counts:
+        language_counts[language] = int(round(language_counts[language]))
+    
+    print_results(language_counts, file_stats, margins, title="代码统计估算结果")
+    print_skipped(file_stats)
+    print(f"抽样读取 {sampled_files}/{sum(len(m) for m in strata.values())} 个源文件，"
+          f"用时 {time.monotonic() - started:.1f}秒，±列为95%置信区间")
+    
+    save_to_log(directory, language_counts, sum(language_counts.values()), file_stats, False, margins)
+
+def write_snapshot(path, files):
+    """
+    将逐文件统计结果写入可用mmap直接查询的二进制快照
+    
+    文件记录按UTF-8编码的路径排序，因此同一路径前缀下的文件在记录中连续存放；
+    每个目录在目录索引中记录其文件范围和按语言汇总的结果，另有全部文件和每种语言
+    各自按行数降序的下标数组用于Top-N查询。
+    
+    Args:
+        path (str): 快照文件路径
+        files (list): 文件统计记录列表，即 file_stats['files']
+    """
+    import bisect
+    import struct
+    
+    entries = sorted(((f['path'].replace(os.sep, '/').encode('utf-8'), f) for f in files),
+                     key=lambda item: item[0])
+    paths = [item[0] for item in entries]
+    languages = sorted({f['language'] for f in files})
+    language_ids = {language: i for i, language in enumerate(languages)}
+    
+    # 按目录前缀（含结尾的/，根目录为空串）汇总各语言的文件数、行数和大小
+    dir_totals = defaultdict(lambda: defaultdict(lambda: [0, 0, 0]))
+    for encoded, f in entries:
+        parts = encoded.split(b'/')[:-1]
+        for i in range(len(parts) + 1):
+            totals = dir_totals[b''.join(p + b'/' for p in parts[:i])][language_ids[f['language']]]
+            totals[0] += 1
+            totals[1] += f['lines']
+            totals[2] += f['size']
+    dir_paths = sorted(dir_totals)
+    
+    strings = bytearray()
+    records = bytearray()
+    for encoded, f in entries:
+        records += struct.pack(SNAPSHOT_RECORD, len(strings), len(encoded), language_ids[f['language']],
+                               0, f['lines'], f['size'], f['mtime'])
+        strings += encoded
+    
+    dirs = bytearray()
+    aggs = bytearray()
+    agg_count = 0
+    for dir_path in dir_paths:
+        start = bisect.bisect_left(paths, dir_path)
+        end = bisect.bisect_left(paths, dir_path + b'\xff')
+        by_language = dir_totals[dir_path]
+        dirs += struct.pack(SNAPSHOT_DIR, len(strings), len(dir_path), start, end, agg_count, len(by_language))
+        strings += dir_path
+        for language_id in sorted(by_language):
+            files_count, lines, size = by_language[language_id]
+            aggs += struct.pack(SNAPSHOT_AGG, language_id, 0, files_count, lines, size)
+            agg_count += 1
+    
+    language_table = bytearray()
+    for language in languages:
+        encoded = language.encode('utf-8')
+        language_table += struct.pack('<H', len(encoded)) + encoded
+    
+    # 稳定排序：按语言分组后各语言内部仍按行数降序
+    order = sorted(range(len(entries)), key=lambda i: -entries[i][1]['lines'])
+    by_language = sorted(order, key=lambda i: language_ids[entries[i][1]['language']])
+    top = struct.pack(f'<{2 * len(entries)}I', *order, *by_language)
+    
+    # 各部分依次排在头部之后
+    offset = struct.calcsize(SNAPSHOT_HEADER)
+    offsets = []
+    for section in (language_table, records, strings, dirs, aggs, top):
+        offsets.append(offset)
+        offset += len(section)
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(struct.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(entries),
+                            len(languages), len(dir_paths), agg_count, 0, *offsets))
+        for section in (language_table, records, strings, dirs, aggs, top):
+            f.write(section)
+
+class SnapshotReader:
+    """
+    通过mmap读取扫描快照，只访问查询涉及的部分，不整体加载到内存
+    """
+    
+    def __init__(self, path):
+        import mmap
+        import struct
+        
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"无效的快照文件: {path}")
+        header = struct.unpack_from(SNAPSHOT_HEADER, self.data, 0) \
+            if len(self.data) >= struct.calcsize(SNAPSHOT_HEADER) else None
+        if not header or header[0] != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"无效的快照文件: {path}")
+        if header[1] != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"不支持的快照版本: {header[1]}")
+        (_, _, self.file_count, language_count, self.dir_count, _, _,
+         languages_off, self.records_off, self.strings_off, self.dirs_off,
+         self.aggs_off, self.top_off) = header
+        
+        self.languages = []
+        offset = languages_off
+        for _ in range(language_count):
+            length, = struct.unpack_from('<H', self.data, offset)
+            self.languages.append(self.data[offset + 2:offset + 2 + length].decode('utf-8'))
+            offset += 2 + length
+        
+        self.record_size = struct.calcsize(SNAPSHOT_RECORD)
+        self.dir_size = struct.calcsize(SNAPSHOT_DIR)
+        self.agg_size = struct.calcsize(SNAPSHOT_AGG)
+        
+        # 各语言的行数排序数组紧接在全部文件的数组之后，按语言编号排列，
+        # 长度即根目录聚合项中该语言的文件数
+        self.language_orders = {}
+        root = self.find_dir(b'')
+        if root is not None:
+            offset = self.file_count
+            for language_id, files in self.dir_languages(root):
+                self.language_orders[language_id] = (offset, files)
+                offset += files
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        if getattr(self, 'data', None) is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+    
+    def string(self, offset, length):
+        start = self.strings_off + offset
+        return self.data[start:start + length]
+    
+    def record(self, index):
+        """返回第index个文件记录：(路径, 语言, 行数, 大小, 修改时间)"""
+        import struct
+        path_off, path_len, language_id, _, lines, size, mtime = struct.unpack_from(
+            SNAPSHOT_RECORD, self.data, self.records_off + index * self.record_size)
+        return (self.string(path_off, path_len).decode('utf-8'), self.languages[language_id],
+                lines, size, mtime)
+    
+    def record_path(self, index):
+        import struct
+        path_off, path_len = struct.unpack_from('<QI', self.data, self.records_off + index * self.record_size)
+        return self.string(path_off, path_len)
+    
+    def find_dir(self, dir_path):
+        """在目录索引中二分查找目录，返回目录索引项，不存在时返回None"""
+        import struct
+        lo, hi = 0, self.dir_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = struct.unpack_from(SNAPSHOT_DIR, self.data, self.dirs_off + mid * self.dir_size)
+            current = self.string(entry[0], entry[1])
+            if current == dir_path:
+                return entry
+            if current < dir_path:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+    
+    def dir_languages(self, entry):
+        """返回目录索引项中各语言的 (语言编号, 文件数)"""
+        import struct
+        return [struct.unpack_from('<HxxI', self.data, self.aggs_off + i * self.agg_size)
+                for i in range(entry[4], entry[4] + entry[5])]
+    
+    def prefix_range(self, prefix):
+        """二分查找路径以prefix开头的文件记录下标范围"""
+        def lower_bound(key):
+            lo, hi = 0, self.file_count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.record_path(mid) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+        return lower_bound(prefix), lower_bound(prefix + b'\xff')
+    
+    def resolve(self, prefix):
+        """
+        将查询前缀解析为文件记录范围
+        
+        前缀恰好是一个目录时按目录处理（返回其索引项），否则作为路径字符串前缀匹配。
+        开头的 / 和 ./ 都相对快照根目录，去掉后再匹配，'/' 与 '' 都表示整个快照。
+        """
+        prefix = prefix.replace('\\', '/')
+        while prefix.startswith(('/', './')):
+            prefix = prefix[prefix.index('/') + 1:]
+        encoded = prefix.encode('utf-8')
+        if not encoded or encoded.endswith(b'/'):
+            dir_path = encoded
+        else:
+            dir_path = encoded + b'/'
+        entry = self.find_dir(dir_path)
+        if entry is not None:
+            return entry[2], entry[3], entry
+        start, end = self.prefix_range(encoded)
+        return start, end, None
+    
+    def totals(self, prefix='', language=None):
+        """
+        汇总路径前缀下各语言的文件数、行数和大小
+        
+        Returns:
+            dict: 语言 -> (文件数, 行数, 大小)
+        """
+        import struct
+        start, end, entry = self.resolve(prefix)
+        result = {}
+        if entry is not None:
+            # 目录前缀直接使用预先汇总的结果
+            for i in range(entry[4], entry[4] + entry[5]):
+                language_id, _, files, lines, size = struct.unpack_from(
+                    SNAPSHOT_AGG, self.data, self.aggs_off + i * self.agg_size)
+                result[self.languages[language_id]] = (files, lines, size)
+        else:
+            for i in range(start, end):
+                _, file_language, lines, size, _ = self.record(i)
+                files_count, total_lines, total_size = result.get(file_language, (0, 0, 0))
+                result[file_language] = (files_count + 1, total_lines + lines, total_size + size)
+        if language is not None:
+            result = {k: v for k, v in result.items() if k == language}
+        return result
+    
+    def top(self, n, prefix='', language=None):
+        """
+        按行数降序返回路径前缀下的前n个文件记录
+        
+        按预先排好的行数顺序（指定语言时用该语言的顺序）查找范围内的文件，预计要检查
+        的记录数超过前缀范围的大小时，改为只读取范围内记录的语言和行数取前n个。
+        """
+        import heapq
+        import struct
+        from operator import itemgetter
+        
+        start, end, entry = self.resolve(prefix)
+        if language is None:
+            language_id = None
+            order_start, order_count = 0, self.file_count
+        elif language in self.languages:
+            language_id = self.languages.index(language)
+            order_start, order_count = self.language_orders.get(language_id, (0, 0))
+        else:
+            return []
+        
+        # 范围内符合条件的文件数：目录前缀可从聚合项得到，否则以范围大小为上限
+        if entry is None:
+            matching = end - start
+        else:
+            matching = sum(files for i, files in self.dir_languages(entry) if language_id in (None, i))
+        if not matching or not n:
+            return []
+        
+        if end - start <= n * order_count // matching:
+            records = self.data[self.records_off + start * self.record_size:
+                                self.records_off + end * self.record_size]
+            candidates = ((lines, index) for index, (file_language, lines)
+                          in enumerate(struct.iter_unpack(SNAPSHOT_RECORD_KEY, records), start)
+                          if language_id in (None, file_language))
+            return [self.record(index) for _, index in heapq.nlargest(n, candidates, key=itemgetter(0))]
+        
+        # 按预计需要检查的记录数的两倍分块读取行数顺序，通常一块就够
+        result = []
+        chunk = max(2 * n * order_count // matching, 256)
+        for block_start in range(order_start, order_start + order_count, chunk):
+            block_end = min(block_start + chunk, order_start + order_count)
+            for index, in struct.iter_unpack('<I', self.data[self.top_off + block_start * 4:
+                                                              self.top_off + block_end * 4]):
+                if start <= index < end:
+                    result.append(self.record(index))
+                    if len(result) >= n:
+                        return result
+        return result
+
+def run_query(args):
+    """
+    处理 query 子命令：打开快照回答路径前缀、语言和Top-N查询
+    
+    Args:
+        args (list): query 之后的命令行参数
+    """
+    import time
+    from datetime import datetime
+    
+    snapshot = None
+    prefix = ''
+    language = None
+    top = 0
+    while args:
+        arg = args.pop(0)
+        if arg in ['--prefix', '--language', '--top']:
+            if not args:
+                print(f"错误：{arg} 需要一个参数")
+                sys.exit(1)
+            value = args.pop(0)
+            if arg == '--prefix':
+                prefix = value
+            elif arg == '--language':
+                language = value
+            elif not value.isdigit():
+                print("错误：--top 需要一个正整数")
+                sys.exit(1)
+            else:
+                top = int(value)
+        else:
+            snapshot = arg
+    
+    if not snapshot:
+        print("错误：请指定快照文件，例如 python code_counter.py query reports/scan.snap")
+        sys.exit(1)
+    if not os.path.isfile(snapshot):
+        print(f"错误：快照文件 '{snapshot}' 不存在")
+        sys.exit(1)
+    
+    started = time.perf_counter()
+    with SnapshotReader(snapshot) as reader:
+        totals = reader.totals(prefix, language)
+        top_files = reader.top(top, prefix, language) if top else []
+    elapsed = (time.perf_counter() - started) * 1000
+    
+    language_counts = defaultdict(int)
+    file_stats = {'total_files': 0, 'total_size': 0}
+    for name, (files_count, lines, size) in totals.items():
+        language_counts[name] = lines
+        file_stats[name] = {'files': files_count, 'size': size}
+        file_stats['total_files'] += files_count
+        file_stats['total_size'] += size
+    
+    print_results(language_counts, file_stats, title=f"查询结果（前缀: {prefix or '/'}）")
+    
+    if top_files:
+        print(f"\n行数最多的 {len(top_files)} 个文件:")
+        print("-" * 40)
+        for path, file_language, lines, size, mtime in top_files:
+            print(f"{lines:>10}  {file_language:<15}{format_size(size):>12}  "
+                  f"{datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')}  {path}")
+    
+    print(f"\n查询用时: {elapsed:.2f}毫秒")
+
+def print_usage():
+    """打印使用说明"""
+    print("""
+代码行数统计工具
+
+用法:
+    python code_counter.py [选项] [目录路径]
+    python code_counter.py query 快照文件 [--prefix 路径前缀] [--language 语言] [--top N]
+    python code_counter.py worker --connect HOST:PORT [--root 本机目录路径]
+
+选项:
+    -h, --help      显示帮助信息
     -d, --detailed  输出详细的文件列表
+    -a, --archives  直接读取zip/tar/gz归档文件中的代码，无需解压
+    -p, --progress  显示扫描进度、吞吐量和预计剩余时间
+    --progress-file PATH
+                    将JSON Lines格式的进度记录写入文件
+    --progress-fd N 将JSON Lines格式的进度记录写入文件描述符N
+    --authors       按git blame统计各作者和团队的代码行数
+    --jobs N        并行运行git blame的进程数（默认为CPU核数）
+    --checkpoint PATH
+                    定期把已完成的目录和部分统计结果写入检查点日志
+    --resume        从 --checkpoint 指定的日志继续之前中断的统计
+    --keep-generated
+                    不根据文件内容跳过生成文件和压缩文件
+    --clones        检测重复代码，按语言和目录统计重复行比例并列出最大的重复代码组
+    --metrics       在同一遍读取中统计函数数、最大嵌套深度和长行数
+    --snapshot PATH 将逐文件统计结果保存为可快速查询的快照文件
+    --listen HOST:PORT
+                    以协调节点模式运行，等待工作节点连接并分配分片
+    --local-workers N
+                    以协调节点模式运行，并在本机启动N个工作进程
+    --shard-by dir|hash
+                    分片方式：按顶层目录（默认）或按路径哈希
+    --shards N      按哈希分片时的分片数（默认16）
+    --estimate      抽样估算模式，快速给出带置信区间的近似结果
+    --budget T      估算模式的时间预算，如 30s、2m（默认30s）
+    --archive-depth N
+                    归档文件最多展开的嵌套层数（默认2）
     
 参数:
     目录路径        可选，要统计的目录路径，默认为当前目录
@@ -851,6 +3359,16 @@ def print_usage():
     python code_counter.py                 # 统计当前目录
     python code_counter.py /path/to/code   # 统计指定目录
     python code_counter.py -d              # 输出详细信息
+    python code_counter.py -a /path/to/drops  # 同时统计归档文件中的代码
+    python code_counter.py --estimate --budget 30s /mnt/archive  # 30秒内估算
+    python code_counter.py --snapshot reports/scan.snap /path/to/code  # 保存快照
+    python code_counter.py query reports/scan.snap --prefix services/payments --language Go
+    python code_counter.py --authors /path/to/repo          # 按作者和团队统计
+    python code_counter.py --clones /path/to/code           # 检测重复代码
+    python code_counter.py --metrics /path/to/code          # 统计函数数、嵌套深度和长行
+    python code_counter.py --checkpoint reports/scan.journal --resume /mnt/big  # 可中断续跑
+    python code_counter.py --listen 0.0.0.0:7070 --shard-by hash /mnt/storage  # 协调节点
+    python code_counter.py worker --connect coordinator-host:7070        # 工作节点
     """)
 
 def get_directory_input():
@@ -862,10 +3380,53 @@ def get_directory_input():
 if __name__ == '__main__':
     try:
         detailed = False
+        scan_archives = False
+        archive_depth = DEFAULT_ARCHIVE_DEPTH
+        estimate = False
+        budget = DEFAULT_ESTIMATE_BUDGET
+        show_progress = False
+        progress_target = None
+        snapshot = None
+        skip_generated = True
+        authors = False
+        jobs = None
+        checkpoint = None
+        resume = False
+        clones = False
+        metrics = False
+        listen = None
+        local_workers = 0
+        shard_by = 'dir'
+        shard_count = DEFAULT_SHARD_COUNT
         directory = '.'
         
         # 处理命令行参数
         args = sys.argv[1:]
+        if args and args[0] == 'query':
+            run_query(args[1:])
+            sys.exit(0)
+        if args and args[0] == 'worker':
+            connect = None
+            root = None
+            args = args[1:]
+            while args:
+                arg = args.pop(0)
+                if arg in ['--connect', '--root'] and args:
+                    if arg == '--connect':
+                        connect = parse_address(args.pop(0))
+                    else:
+                        root = args.pop(0)
+                else:
+                    print(f"错误：无法识别的参数 '{arg}'")
+                    sys.exit(1)
+            if connect is None:
+                print("错误：工作节点需要 --connect HOST:PORT")
+                sys.exit(1)
+            if root is not None and not os.path.isdir(root):
+                print(f"错误：--root '{root}' 不存在或不是一个目录")
+                sys.exit(1)
+            run_worker(connect, root)
+            sys.exit(0)
         while args:
             arg = args.pop(0)
             if arg in ['-h', '--help']:
@@ -873,6 +3434,75 @@ if __name__ == '__main__':
                 sys.exit(0)
             elif arg in ['-d', '--detailed']:
                 detailed = True
+            elif arg in ['-a', '--archives']:
+                scan_archives = True
+            elif arg == '--archive-depth':
+                value = args.pop(0) if args else ''
+                if not value.isdigit() or int(value) < 1:
+                    print("错误：--archive-depth 需要一个正整数")
+                    sys.exit(1)
+                archive_depth = int(value)
+            elif arg in ['-p', '--progress']:
+                show_progress = True
+            elif arg in ['--progress-file', '--progress-fd']:
+                if not args:
+                    print(f"错误：{arg} 需要一个参数")
+                    sys.exit(1)
+                value = args.pop(0)
+                if arg == '--progress-fd' and not value.isdigit():
+                    print("错误：--progress-fd 需要一个文件描述符编号")
+                    sys.exit(1)
+                progress_target = int(value) if arg == '--progress-fd' else value
+            elif arg == '--authors':
+                authors = True
+            elif arg == '--jobs':
+                value = args.pop(0) if args else ''
+                if not value.isdigit() or int(value) < 1:
+                    print("错误：--jobs 需要一个正整数")
+                    sys.exit(1)
+                jobs = int(value)
+            elif arg == '--checkpoint':
+                if not args:
+                    print("错误：--checkpoint 需要一个文件路径")
+                    sys.exit(1)
+                checkpoint = args.pop(0)
+            elif arg == '--resume':
+                resume = True
+            elif arg == '--keep-generated':
+                skip_generated = False
+            elif arg == '--clones':
+                clones = True
+            elif arg == '--metrics':
+                metrics = True
+            elif arg == '--snapshot':
+                if not args:
+                    print("错误：--snapshot 需要一个文件路径")
+                    sys.exit(1)
+                snapshot = args.pop(0)
+            elif arg in ['--listen', '--local-workers', '--shard-by', '--shards']:
+                value = args.pop(0) if args else ''
+                if arg == '--listen':
+                    listen = parse_address(value)
+                elif arg == '--shard-by':
+                    if value not in ('dir', 'hash'):
+                        print("错误：--shard-by 只能是 dir 或 hash")
+                        sys.exit(1)
+                    shard_by = value
+                elif not value.isdigit() or int(value) < 1:
+                    print(f"错误：{arg} 需要一个正整数")
+                    sys.exit(1)
+                elif arg == '--local-workers':
+                    local_workers = int(value)
+                else:
+                    shard_count = int(value)
+            elif arg == '--estimate':
+                estimate = True
+            elif arg == '--budget':
+                try:
+                    budget = parse_duration(args.pop(0) if args else '')
+                except ValueError:
+                    print("错误：--budget 需要一个时长，例如 30s、2m")
+                    sys.exit(1)
             else:
                 directory = arg
         
@@ -888,8 +3518,80 @@ if __name__ == '__main__':
             print(f"错误：'{directory}' 不是一个目录")
             sys.exit(1)
         
+        if resume and not checkpoint:
+            print("错误：--resume 需要同时用 --checkpoint 指定检查点日志")
+            sys.exit(1)
+        
+        if estimate and scan_archives:
+            print("错误：估算模式不支持统计归档文件")
+            sys.exit(1)
+        
+        # 估算模式只读取抽样的文件，不会生成逐文件的列表和快照
+        if estimate and (detailed or snapshot):
+            print("错误：估算模式不支持 -d 和 --snapshot")
+            sys.exit(1)
+        
+        if estimate and (listen or local_workers):
+            print("错误：估算模式不能与协调节点模式（--listen、--local-workers）同时使用")
+            sys.exit(1)
+        
+        # 重复代码需要读取所有文件的内容，续跑时已完成的目录不会重新读取
+        if clones and (resume or estimate or listen or local_workers):
+            print("错误：--clones 不能与 --resume、--estimate 或协调节点模式同时使用")
+            sys.exit(1)
+        
+        if metrics and estimate:
+            print("错误：估算模式不支持代码度量")
+            sys.exit(1)
+        
+        if checkpoint and estimate:
+            print("错误：估算模式不支持 --checkpoint/--resume")
+            sys.exit(1)
+        
+        if authors and estimate:
+            print("错误：估算模式不支持作者统计")
+            sys.exit(1)
+        
+        # 估算模式按时间预算抽样，不会逐个处理文件，没有文件数和剩余时间意义上的进度
+        if estimate and (show_progress or progress_target is not None):
+            print("错误：估算模式不支持进度显示（-p、--progress-file、--progress-fd）")
+            sys.exit(1)
+        
+        # 协调节点只合并工作节点发回的分片结果，不读取文件，也没有逐目录的检查点和进度
+        if (listen or local_workers) and (authors or checkpoint or show_progress or progress_target is not None):
+            print("错误：协调节点模式不支持 --authors、--checkpoint/--resume 和进度显示（-p、--progress-file、--progress-fd）")
+            sys.exit(1)
+        
         # 执行统计
-        count_lines_by_extension(directory, detailed)
+        if estimate:
+            estimate_lines_by_extension(directory, budget, skip_generated)
+        elif listen or local_workers:
+            run_coordinator(directory, listen or ('127.0.0.1', 0), local_workers, shard_by, shard_count,
+                            detailed, scan_archives, archive_depth, snapshot, skip_generated, metrics)
+        elif show_progress or progress_target is not None:
+            # 优先使用上次扫描的总量估算剩余时间，没有记录时进度先开始输出，在后台做一次元数据预扫描
+            totals = load_progress_totals(directory, scan_archives)
+            stream = None
+            if progress_target is not None:
+                stream = open(progress_target, 'w', encoding='utf-8', closefd=not isinstance(progress_target, int))
+            progress = ProgressReporter(*(totals or (0, 0)), console=show_progress, stream=stream)
+            progress.start()
+            if totals is None:
+                progress.count_totals(directory, scan_archives)
+            try:
+                count_lines_by_extension(directory, detailed, scan_archives, archive_depth, progress, snapshot,
+                                         skip_generated, authors, jobs, checkpoint, resume, clones, metrics)
+            finally:
+                progress.stop()
+                if stream is not None:
+                    stream.close()
+            # 续跑时已完成部分的计数来自检查点（归档按成员计数），只是近似值，不覆盖上次记录的总量
+            if not resume:
+                save_progress_totals(directory, progress.files, progress.bytes, scan_archives)
+        else:
+            count_lines_by_extension(directory, detailed, scan_archives, archive_depth, snapshot=snapshot,
+                                     skip_generated=skip_generated, authors=authors, jobs=jobs,
+                                     checkpoint=checkpoint, resume=resume, clones=clones, metrics=metrics)
         
     except KeyboardInterrupt:
         print("\n统计被用户中断")